@@ -3,12 +3,15 @@ from __future__ import unicode_literals
 import json
 import datetime
 
+from django.db import transaction
 from django.template.defaultfilters import escape
 
 from program.models import Program
-from notification.models import Notif
+from notification.jobs import send_notif
+from notification.models import uncount_comment_notifs
 from ourjseditor import api
-from .models import Comment
+from ourjseditor.util import create_with_random_id, get_as_int
+from .models import COMMENTS_PER_PAGE, MAX_INLINE_REPLIES, Comment, get_comment_page, get_first_replies
 
 
 # /program/PRO_ID/comment/new
@@ -17,7 +20,7 @@ from .models import Comment
 def new_comment(request, program_id):
     data = json.loads(request.body)
 
-    program = Program.objects.get(program_id=program_id)
+    program = Program.objects.without_code().get(program_id=program_id)
     if not program.can_user_view(request.user):
         return api.error("Not authorized.", status=401)
 
@@ -40,7 +43,8 @@ def new_comment(request, program_id):
         parent_comment.reply_count += 1
         parent_comment.save()
 
-    created_comment = Comment.objects.create(
+    created_comment = create_with_random_id(
+        Comment,
         user=request.user,
         program=program,
         parent=parent_comment,
@@ -53,8 +57,8 @@ def new_comment(request, program_id):
 
     if depth == 0:
         if program.user != created_comment.user:
-            Notif.objects.create(
-                target_user=program.user,
+            send_notif(
+                [program.user_id],
                 link=link,
                 description="<strong>{0}</strong> left a comment on your program, <strong>{1}</strong>".format(
                     escape(request.user.profile.display_name), escape(program.title)
@@ -70,9 +74,9 @@ def new_comment(request, program_id):
             .values_list("user", flat=True)
         )
 
-        for user in to_notify:
-            Notif.objects.create(
-                target_user_id=user,
+        if to_notify:
+            send_notif(
+                to_notify,
                 link=link,
                 description="<strong>{0}</strong> commented on a thread on <strong>{1}</strong>".format(
                     escape(request.user.profile.display_name), escape(program.title)
@@ -82,8 +86,8 @@ def new_comment(request, program_id):
 
         # Notify the original comment creator separately, if that's not the same person that posted this reply
         if parent_comment.user != created_comment.user:
-            Notif.objects.create(
-                target_user=parent_comment.user,
+            send_notif(
+                [parent_comment.user_id],
                 link=link,
                 description="<strong>{0}</strong> replied to your comment on <strong>{1}</strong>".format(
                     escape(request.user.profile.display_name), escape(program.title)
@@ -110,7 +114,7 @@ def comment(request, *args):
 
         requested_comment = Comment.objects.get(program_id=program_id, comment_id=comment_id)
 
-    program = requested_comment.program
+    program = Program.objects.without_code().get(program_id=requested_comment.program_id)
     if not program.can_user_view(request.user):
         return api.error("Not authorized.", status=401)
 
@@ -139,7 +143,9 @@ def comment(request, *args):
             parent.reply_count -= 1
             parent.save()
 
-        requested_comment.delete()
+        with transaction.atomic():
+            uncount_comment_notifs(requested_comment)
+            requested_comment.delete()
 
         return api.succeed()
 
@@ -156,7 +162,8 @@ def comment_comments(request, *args):
         comment_id = args[1]
 
     # check if the comments are from a private program
-    program_of_comments = Comment.objects.get(comment_id=comment_id).program
+    program_id_of_comments = Comment.objects.values_list("program_id", flat=True).get(comment_id=comment_id)
+    program_of_comments = Program.objects.without_code().get(program_id=program_id_of_comments)
     if not program_of_comments.can_user_view(request.user):
         return api.error("Not authorized.", status=401)
 
@@ -173,14 +180,33 @@ def comment_comments(request, *args):
     })
 
 
-# /program/PRO_ID/comments
+# /program/PRO_ID/comments ?limit=30&cursor=CURSOR&replies=3
+# Newest first. Pass nextCursor as the cursor to get the next page
+# With replies=N, each comment includes its first N replies (as "replies"), so short threads don't need a request each
 @api.StandardAPIErrors("GET")
 def program_comments(request, program_id):
-    program = Program.objects.get(program_id=program_id)
+    program = Program.objects.without_code().get(program_id=program_id)
     if not program.can_user_view(request.user):
         return api.error("Not authorized.", status=401)
 
-    comments = list(Comment.objects.select_related("user__profile").filter(program_id=program_id, depth=0).order_by("-created"))
+    limit = get_as_int(request.GET, "limit")
+    if limit is None or limit <= 0 or limit > COMMENTS_PER_PAGE:
+        limit = COMMENTS_PER_PAGE
+
+    reply_count = min(max(get_as_int(request.GET, "replies", 0), 0), MAX_INLINE_REPLIES)
+
+    try:
+        comments, next_cursor = get_comment_page(program_id, request.GET.get("cursor"), limit)
+    except ValueError as err:
+        return api.error(str(err))
+
+    comment_dicts = [c.to_dict() for c in comments]
+    if reply_count:
+        replies = get_first_replies(comments, reply_count)
+        for comment_dict in comment_dicts:
+            comment_dict["replies"] = [r.to_dict() for r in replies[comment_dict["id"]]]
+
     return api.succeed({
-        "comments": [c.to_dict() for c in comments]
+        "comments": comment_dicts,
+        "nextCursor": next_cursor,
     })
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0014_program_card_version'),
+        ('comment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['program', 'depth', '-created', '-comment_id'], name='comment_program_idx'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='program',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='program.program'),
+        ),
+    ]
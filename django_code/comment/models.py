@@ -1,25 +1,20 @@
 from __future__ import unicode_literals
 
-import random
-
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
+from django.utils.dateparse import parse_datetime
 
 from program.models import Program
+from ourjseditor.util import pack_cursor, random_id, unpack_cursor
 
 
 # 10 character random id. May conflict with notifications
-CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-"
+# Not checked for collisions, create comments with ourjseditor.util.create_with_random_id
 def generate_comment_id():
-    id_string = ""
-    while len(id_string) < 10:
-        id_string += random.choice(CHARS)
-
-    try:
-        Comment.objects.get(comment_id=id_string)
-        return generate_comment_id()
-    except Comment.DoesNotExist:
-        return id_string
+    return random_id(10)
 
 
 def get_default_user():
@@ -29,7 +24,7 @@ def get_default_user():
 class Comment(models.Model):
     comment_id = models.CharField(primary_key=True, max_length=10, default=generate_comment_id)
     user = models.ForeignKey(User, on_delete=models.CASCADE, blank=False)
-    program = models.ForeignKey(Program, on_delete=models.CASCADE, blank=False) # This program this was posted on
+    program = models.ForeignKey(Program, on_delete=models.CASCADE, blank=False, db_index=False) # This program this was posted on. Indexed by comment_program_idx
     parent = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True) # The comment this is a reply to, or None
     depth = models.IntegerField(blank=False) # 0 for comments on programs, 1 for replys to comments on programs, etc.
     reply_count = models.IntegerField(blank=False, default=0)
@@ -40,13 +35,19 @@ class Comment(models.Model):
     content = models.TextField(blank=True) # Can be edited
     original_content = models.TextField(blank=True) # Can't be edited. For API and mod access
 
+    class Meta:
+        # Matches the order of get_comment_page
+        indexes = [
+            models.Index(fields=["program", "depth", "-created", "-comment_id"], name="comment_program_idx"),
+        ]
+
     def to_dict(self):
         edited = self.edited
         if edited is not None:
             edited = edited.replace(microsecond=0).isoformat() + "Z"
 
-        parent = self.parent
-        if parent is not None:
+        parent = None
+        if self.parent_id is not None:
             parent = {"id": self.parent_id}
 
         return {
@@ -67,3 +68,55 @@ class Comment(models.Model):
             "content": self.content,
             "originalContent": self.original_content,
         }
+
+
+COMMENTS_PER_PAGE = 30
+MAX_INLINE_REPLIES = 10
+
+
+# A program's comments (not replies), newest first, as (comments, next_cursor). next_cursor is None on the last page
+def get_comment_page(program_id, cursor=None, limit=COMMENTS_PER_PAGE):
+    comments = Comment.objects.select_related("user__profile").filter(program_id=program_id, depth=0)
+
+    if cursor is not None:
+        created, comment_id = unpack_cursor(cursor)
+        try:
+            created = parse_datetime(created) if isinstance(created, str) else None
+        except ValueError:
+            created = None
+        if created is None:
+            raise ValueError("Invalid cursor.")
+        comments = comments.filter(Q(created__lt=created) | Q(created=created, comment_id__lt=comment_id))
+
+    # One extra, to find out whether there's another page
+    comments = list(comments.order_by("-created", "-comment_id")[:limit + 1])
+
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = pack_cursor(comments[-1].created.isoformat(), comments[-1].comment_id)
+
+    return comments, next_cursor
+
+
+# The first `count` replies to each of the comments, oldest first, as {comment id: [replies]}. One query for all of them
+def get_first_replies(comments, count):
+    if not comments:
+        return {}
+
+    ranked = (Comment.objects
+        .filter(parent_id__in=[c.comment_id for c in comments])
+        .annotate(reply_rank=Window(
+            RowNumber(),
+            partition_by=[F("parent_id")],
+            order_by=[F("created").asc(), F("comment_id").asc()],
+        ))
+        .values("comment_id", "reply_rank"))
+    # Window functions can't be filtered on directly (before Django 4.2), so the ranking is a subquery
+    sql, params = ranked.query.sql_with_params()
+    first = RawSQL("SELECT comment_id FROM ({}) ranked WHERE reply_rank <= %s".format(sql), params + (count,))
+
+    replies = {c.comment_id: [] for c in comments}
+    for reply in Comment.objects.select_related("user__profile").filter(comment_id__in=first).order_by("created", "comment_id"):
+        replies[reply.parent_id].append(reply)
+    return replies
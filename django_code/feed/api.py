@@ -0,0 +1,26 @@
+from __future__ import unicode_literals
+
+from program.models import PROGRAMS_PER_PAGE, serialize_programs
+from ourjseditor import api
+from ourjseditor.util import get_as_int
+from .models import get_feed_page
+
+
+# /api/feed ?limit=20&cursor=CURSOR
+# The newest programs published by the people the user is subscribed to
+@api.StandardAPIErrors("GET")
+@api.login_required
+def feed(request):
+    limit = get_as_int(request.GET, "limit")
+    if limit is None or limit <= 0 or limit > PROGRAMS_PER_PAGE:
+        limit = PROGRAMS_PER_PAGE
+
+    try:
+        programs, next_cursor = get_feed_page(request.user, request.GET.get("cursor"), limit)
+    except ValueError as err:
+        return api.error(str(err))
+
+    return api.succeed({
+        "programs": serialize_programs(programs, include_code=False),
+        "nextCursor": next_cursor,
+    })
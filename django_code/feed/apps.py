@@ -0,0 +1,4 @@
+from django.apps import AppConfig
+
+class FeedConfig(AppConfig):
+    name = u"feed"
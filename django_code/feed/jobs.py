@@ -0,0 +1,37 @@
+from __future__ import unicode_literals
+
+from job.models import task, enqueue
+from program.models import Program
+from user_profile.models import Profile
+from .models import FeedEntry, PopularAuthor, FANOUT_LIMIT, add_feed_entries
+
+
+# Background tasks, so publishing doesn't wait on every subscriber's feed. Run by `manage.py run_jobs`
+
+@task("fan_out")
+def fan_out(job, program_id):
+    program = (Program.objects
+        .select_related("user__profile")
+        .filter(program_id=program_id, last_published__isnull=False)
+        .only("program_id", "last_published", "user__profile__profile_id")
+        .first())
+    if program is None: # Deleted since the job was enqueued
+        return
+
+    author = program.user.profile
+    if PopularAuthor.objects.filter(profile=author).exists():
+        return
+
+    subscribers = Profile.objects.filter(subscriptions=author).values_list("user_id", flat=True)
+    if subscribers[:FANOUT_LIMIT + 1].count() > FANOUT_LIMIT:
+        PopularAuthor.objects.get_or_create(profile=author)
+        return
+
+    add_feed_entries(subscribers.iterator(), [(program.program_id, program.last_published)])
+
+
+# Call when a program is (re)published. Subscribers that already have the program in their feed see it move
+# to the top straight away; it's added to the other feeds by a job
+def add_to_feeds(program):
+    FeedEntry.objects.filter(program_id=program.program_id).update(published_at=program.last_published)
+    enqueue("fan_out", program_id=program.program_id)
@@ -0,0 +1,71 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# feed.models.FANOUT_LIMIT when this migration was written
+FANOUT_LIMIT = 1000
+
+
+# Fans out every published program to its author's current subscribers
+def build_feeds(apps, schema_editor):
+    Profile = apps.get_model("user_profile", "Profile")
+    Program = apps.get_model("program", "Program")
+    FeedEntry = apps.get_model("feed", "FeedEntry")
+    PopularAuthor = apps.get_model("feed", "PopularAuthor")
+
+    subscriptions = Profile.subscriptions.through.objects.values_list("from_profile__user_id", "to_profile_id", "to_profile__user_id")
+    subscribers = {}
+    for subscriber_id, author_profile_id, author_id in subscriptions:
+        subscribers.setdefault((author_profile_id, author_id), []).append(subscriber_id)
+
+    for (author_profile_id, author_id), user_ids in subscribers.items():
+        if len(user_ids) > FANOUT_LIMIT:
+            PopularAuthor.objects.create(profile_id=author_profile_id)
+            continue
+
+        programs = Program.objects.filter(user_id=author_id, last_published__isnull=False).values_list("program_id", "last_published")
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=user_id, program_id=program_id, published_at=published_at)
+            for program_id, published_at in programs
+            for user_id in user_ids
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('program', '0013_fork_links'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('user_profile', '0006_profile_subscriptions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularAuthor',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='user_profile.profile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('published_at', models.DateTimeField()),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='program.program')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-published_at', '-program'], name='feedentry_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'program'), name='feedentry_unique'),
+        ),
+        migrations.RunPython(build_feeds, migrations.RunPython.noop),
+    ]
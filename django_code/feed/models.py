@@ -0,0 +1,113 @@
+from __future__ import unicode_literals
+
+import itertools
+
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import Q
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from program.models import Program, PROGRAMS_PER_PAGE, decode_cursor, encode_cursor
+from user_profile.models import Profile
+
+# Authors with more subscribers than this aren't fanned out to every subscriber's feed when they publish.
+# Their programs are read from the program table instead (see get_feed_page)
+FANOUT_LIMIT = 1000
+FEED_BATCH_SIZE = 500
+
+
+# One of the programs in a user's subscriptions feed: a published program by someone they're subscribed to.
+# Added when the program is published (see feed.jobs) or the user subscribes. Private programs
+# keep their entries (they can be made public again), and are filtered out when the feed is read
+class FeedEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False) # Indexed by feedentry_user_idx
+    program = models.ForeignKey(Program, on_delete=models.CASCADE)
+    published_at = models.DateTimeField() # The program's last_published
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "program"], name="feedentry_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-published_at", "-program"], name="feedentry_user_idx"),
+        ]
+
+
+# Authors whose programs are read from the program table rather than fanned out. Once an author has
+# been too popular to fan out, they stay here, so feeds never miss the programs they published meanwhile
+class PopularAuthor(models.Model):
+    profile = models.OneToOneField(Profile, on_delete=models.CASCADE, primary_key=True)
+
+
+# programs is a list of (program_id, last_published). Entries that already exist are left alone
+def add_feed_entries(user_ids, programs):
+    entries = (
+        FeedEntry(user_id=user_id, program_id=program_id, published_at=published_at)
+        for user_id in user_ids
+        for program_id, published_at in programs
+    )
+    while True:
+        batch = list(itertools.islice(entries, FEED_BATCH_SIZE))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+# Keeps feeds in step with Profile.subscriptions. With reverse=True, instance is the author and pk_set the subscribers
+@receiver(m2m_changed, sender=Profile.subscriptions.through)
+def update_feeds(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "post_add":
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        popular = set(PopularAuthor.objects.filter(profile_id__in=[author for _, author in pairs]).values_list("profile_id", flat=True))
+        user_ids = dict(Profile.objects.filter(profile_id__in=set(itertools.chain(*pairs))).values_list("profile_id", "user_id"))
+
+        for subscriber, author in pairs:
+            if author not in popular:
+                programs = list(Program.objects
+                    .filter(user_id=user_ids[author], last_published__isnull=False)
+                    .values_list("program_id", "last_published"))
+                add_feed_entries([user_ids[subscriber]], programs)
+    elif action == "post_remove":
+        if reverse:
+            FeedEntry.objects.filter(user__profile__in=pk_set, program__user_id=instance.user_id).delete()
+        else:
+            FeedEntry.objects.filter(user_id=instance.user_id, program__user__profile__in=pk_set).delete()
+    elif action == "pre_clear":
+        if reverse:
+            FeedEntry.objects.filter(program__user_id=instance.user_id).delete()
+        else:
+            FeedEntry.objects.filter(user_id=instance.user_id).delete()
+
+
+# The newest programs published by the people `user` is subscribed to, as (programs, next_cursor), like
+# get_program_page. Only public programs are included
+def get_feed_page(user, cursor=None, limit=PROGRAMS_PER_PAGE):
+    entries = FeedEntry.objects.filter(user_id=user.id, program__is_private=False)
+
+    # Fan-out on read, for the (usually no) popular authors in the user's subscriptions
+    popular_ids = list(user.profile.subscriptions.filter(popularauthor__isnull=False).values_list("user_id", flat=True))
+    popular = Program.objects.filter(user_id__in=popular_ids, last_published__isnull=False, is_private=False)
+
+    if cursor is not None:
+        value, program_id = decode_cursor("last_published", cursor)
+        entries = entries.filter(Q(published_at__lt=value) | Q(published_at=value, program_id__lt=program_id))
+        popular = popular.filter(Q(last_published__lt=value) | Q(last_published=value, program_id__lt=program_id))
+
+    # Both are newest first, and one extra is loaded to find out whether there's another page.
+    # A program can be in both if its author became popular after it was fanned out
+    rows = set(entries.order_by("-published_at", "-program_id").values_list("published_at", "program_id")[:limit + 1])
+    if popular_ids:
+        rows.update(popular.order_by("-last_published", "-program_id").values_list("last_published", "program_id")[:limit + 1])
+    program_ids = [program_id for _, program_id in sorted(rows, reverse=True)]
+    program_ids = list(dict.fromkeys(program_ids))[:limit + 1]
+
+    programs = Program.objects.without_code().in_bulk(program_ids)
+    programs = [programs[program_id] for program_id in program_ids if program_id in programs]
+
+    next_cursor = None
+    if len(programs) > limit:
+        programs = programs[:limit]
+        next_cursor = encode_cursor("last_published", programs[-1])
+
+    return programs, next_cursor
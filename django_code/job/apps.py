@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+class JobConfig(AppConfig):
+    name = u"job"
+
+    # Tasks are registered by each app's jobs.py, which the worker needs to import
+    def ready(self):
+        autodiscover_modules("jobs")
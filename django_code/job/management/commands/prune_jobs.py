@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from job.models import Job
+
+BATCH_SIZE = 1000
+
+
+# Run this regularly (e.g. daily) to keep the job table small. Failed jobs are kept, so their errors can be looked at.
+# Deletes in small batches, each its own transaction, so workers can keep claiming jobs meanwhile
+class Command(BaseCommand):
+    help = "Deletes finished jobs older than the given number of days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="How many days to keep finished jobs for.")
+
+    def handle(self, *args, **options):
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=options["days"])
+        # Found through job_ready_idx
+        done = Job.objects.filter(status=Job.DONE, run_after__lt=cutoff)
+
+        deleted = 0
+        while True:
+            batch = list(done.values_list("id", flat=True)[:BATCH_SIZE])
+            if not batch:
+                break
+            deleted += Job.objects.filter(id__in=batch).delete()[0]
+
+        self.stdout.write("Deleted {} finished jobs.".format(deleted))
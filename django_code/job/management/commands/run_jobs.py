@@ -0,0 +1,37 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django import db
+from django.core.management.base import BaseCommand
+
+from job.models import claim_jobs
+
+
+def run_job(job):
+    try:
+        return job.run()
+    finally:
+        # Each thread has its own database connection
+        db.connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Runs queued jobs (like sending notifications) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4, help="Number of jobs to run at once.")
+        parser.add_argument("--poll", type=float, default=1, help="Seconds to wait between checks when there are no jobs.")
+        parser.add_argument("--once", action="store_true", help="Run every ready job, then exit.")
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            while True:
+                jobs = claim_jobs(options["threads"])
+
+                if jobs:
+                    results = list(pool.map(run_job, jobs))
+                    self.stdout.write("Ran {} jobs ({} failed).".format(len(results), results.count(False)))
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["poll"])
@@ -0,0 +1,111 @@
+from __future__ import unicode_literals
+
+import json
+import logging
+import datetime
+import traceback
+
+from django.db import models, IntegrityError, transaction
+from django.db.models import F, Q
+
+logger = logging.getLogger(__name__)
+
+# Maps task names to the functions that run them. Filled by @task, in each app's jobs.py
+tasks = {}
+
+MAX_ATTEMPTS = 5
+# How long a worker has to finish a job before it's assumed to have crashed, and the job is run again
+LEASE = datetime.timedelta(minutes=5)
+
+
+# Decorator to register a function as a task. It's called with the Job, and the payload as keyword arguments
+def task(name):
+    def register(func):
+        tasks[name] = func
+        return func
+    return register
+
+
+# Adds a job to the queue, to be run by `manage.py run_jobs`. Payload must be JSON serializable.
+# If a job with the same key is waiting to run, nothing is added and None is returned. A job's key is cleared when it
+# starts, so enqueuing again while it runs adds a new job (e.g. to index a program's code again after another save)
+def enqueue(task_name, key=None, **payload):
+    if task_name not in tasks:
+        raise ValueError("Unknown task: {}".format(task_name))
+
+    try:
+        with transaction.atomic():
+            return Job.objects.create(task=task_name, key=key, payload=json.dumps(payload))
+    except IntegrityError:
+        return None
+
+
+# Marks up to `limit` ready jobs as running, and returns them.
+# Safe to call from several workers at once: each job is only claimed by one
+def claim_jobs(limit):
+    now = datetime.datetime.now()
+    ready = (Job.objects
+        .filter(Q(status=Job.PENDING, run_after__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now))
+        .order_by("run_after")
+        .values_list("id", "status", "locked_until", "attempts")[:limit])
+
+    claimed_ids = []
+    for job_id, status, locked_until, attempts in ready:
+        # Only matches if no other worker has claimed the job since it was read
+        unclaimed = Job.objects.filter(id=job_id, status=status, locked_until=locked_until)
+
+        # Every claim is an attempt, so a job that keeps crashing its worker isn't run forever
+        if status == Job.RUNNING and attempts >= MAX_ATTEMPTS:
+            unclaimed.update(status=Job.FAILED, locked_until=None, last_error="The worker stopped while running the job.")
+            continue
+
+        if unclaimed.update(status=Job.RUNNING, locked_until=now + LEASE, attempts=F("attempts") + 1, key=None):
+            claimed_ids.append(job_id)
+
+    return list(Job.objects.filter(id__in=claimed_ids).order_by("run_after"))
+
+
+class Job(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed" # Out of attempts
+
+    task = models.CharField(max_length=50)
+    key = models.CharField(max_length=100, unique=True, blank=True, null=True) # Optional. Stops the same job being enqueued twice before it runs
+    payload = models.TextField() # JSON
+    status = models.CharField(max_length=10, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField(default=datetime.datetime.now)
+    locked_until = models.DateTimeField(blank=True, null=True) # Set while running
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="job_ready_idx"),
+        ]
+
+    # Runs a claimed job. Tasks may be run more than once (after a crash, or a failed attempt),
+    # so they need to be idempotent. Failed jobs are retried with exponential backoff
+    def run(self):
+        # Each claim adds an attempt, so this only matches while this worker still holds the lease.
+        # If it ran out and another worker claimed the job, that worker records the result
+        leased = Job.objects.filter(id=self.id, status=Job.RUNNING, attempts=self.attempts)
+
+        try:
+            tasks[self.task](self, **json.loads(self.payload))
+        except Exception:
+            logger.exception("Job %s (%s) failed on attempt %s", self.id, self.task, self.attempts)
+
+            out_of_attempts = self.attempts >= MAX_ATTEMPTS
+            leased.update(
+                status=Job.FAILED if out_of_attempts else Job.PENDING,
+                run_after=datetime.datetime.now() + datetime.timedelta(seconds=10 * 2 ** self.attempts),
+                locked_until=None,
+                last_error=traceback.format_exc(),
+            )
+            return False
+
+        leased.update(status=Job.DONE, locked_until=None)
+        return True
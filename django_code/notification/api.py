@@ -2,8 +2,13 @@ from __future__ import unicode_literals
 
 import json
 
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
 from ourjseditor import api
-from .models import Notif
+from ourjseditor.util import get_as_int
+from .models import NOTIFS_PER_PAGE, Notif, add_unread, delete_notifs, get_notif_page, set_notifs_read, unread_count
 
 
 # /notif/NOTIFIC_ID
@@ -22,26 +27,99 @@ def notif(request, notif_id):
         if not isinstance(read, bool):
             return api.error("Invalid type for key \"isRead\"")
 
-        requested_notif.is_read = read
-        requested_notif.save()
+        # Only counted if this request is the one that changes it, so repeated or simultaneous requests count once
+        with transaction.atomic():
+            if Notif.objects.filter(notif_id=notif_id, is_read=not read).update(is_read=read):
+                add_unread([request.user.id], sign=-1 if read else 1)
 
         return api.succeed()
 
 
-# /notifs
-@api.StandardAPIErrors("GET")
+MAX_BULK_IDS = 500
+
+
+# The notifications a bulk request applies to: all of the user's notifications ({"all": true}), a list of them
+# ({"ids": [...]}) or the ones created before a time ({"before": "2020-01-01T00:00:00Z"}, like a notification's "created")
+def selected_notifs(user, data):
+    notifs = Notif.objects.filter(target_user_id=user.id)
+
+    if data.get("all") is True:
+        return notifs
+
+    if "ids" in data:
+        ids = data["ids"]
+        if not isinstance(ids, list) or not all(isinstance(notif_id, str) for notif_id in ids):
+            raise ValueError("\"ids\" must be a list of notification ids.")
+        if len(ids) > MAX_BULK_IDS:
+            raise ValueError("At most {} ids can be passed at once.".format(MAX_BULK_IDS))
+        return notifs.filter(notif_id__in=ids)
+
+    if "before" in data:
+        try:
+            before = parse_datetime(data["before"]) if isinstance(data["before"], str) else None
+        except ValueError:
+            before = None
+        if before is None:
+            raise ValueError("Invalid timestamp for \"before\".")
+        if timezone.is_aware(before): # Times are stored as naive UTC
+            before = timezone.make_naive(before, timezone.utc)
+        return notifs.filter(created__lt=before)
+
+    raise ValueError("Pass \"all\", \"ids\" or \"before\" to choose the notifications.")
+
+
+# /notifs ?limit=20&cursor=CURSOR
+# GET: Newest first. Pass nextCursor as the cursor to get the next page
+# PATCH: {"isRead": true, ...} marks many notifications at once, chosen as in selected_notifs
+# DELETE: deletes many notifications, chosen as in selected_notifs
+@api.StandardAPIErrors("GET", "PATCH", "DELETE")
 @api.login_required
 def notif_list(request):
-    notifs = Notif.objects.filter(target_user=request.user).order_by("-created")
-    notifs = [n.to_dict() for n in notifs]
+    if request.method == "PATCH":
+        data = json.loads(request.body)
+        read = data["isRead"]
+        if not isinstance(read, bool):
+            return api.error("Invalid type for key \"isRead\"")
+
+        try:
+            notifs = selected_notifs(request.user, data)
+        except ValueError as err:
+            return api.error(str(err))
+
+        return api.succeed({"changed": set_notifs_read(request.user, notifs, read)})
+
+    elif request.method == "DELETE":
+        try:
+            data = json.loads(request.body)
+            if not isinstance(data, dict):
+                return api.error("Missing or malformed JSON.")
+            notifs = selected_notifs(request.user, data)
+        except json.decoder.JSONDecodeError:
+            return api.error("Missing or malformed JSON.")
+        except ValueError as err:
+            return api.error(str(err))
+
+        # Uncounted by marking them read. Any that arrive unread in the meantime are kept
+        set_notifs_read(request.user, notifs, True)
+        return api.succeed({"deleted": delete_notifs(notifs.filter(is_read=True))})
+
+    limit = get_as_int(request.GET, "limit")
+    if limit is None or limit <= 0 or limit > NOTIFS_PER_PAGE:
+        limit = NOTIFS_PER_PAGE
+
+    try:
+        notifs, next_cursor = get_notif_page(request.user, request.GET.get("cursor"), limit)
+    except ValueError as err:
+        return api.error(str(err))
 
-    return api.succeed({"notifs": notifs})
+    return api.succeed({"notifs": [n.to_dict() for n in notifs], "nextCursor": next_cursor})
 
 
 # /notifs/count
 @api.StandardAPIErrors("GET")
 @api.login_required
 def notif_count(request):
+    # Kept up to date as notifications are created, read and deleted (see notification.models)
     return api.succeed({
-        "notifCount": Notif.objects.filter(target_user=request.user, is_read=False).count()
+        "notifCount": unread_count(request.user.id)
     })
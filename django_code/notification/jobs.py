@@ -0,0 +1,49 @@
+from __future__ import unicode_literals
+
+from job.models import task, enqueue
+from comment.models import Comment
+from program.models import Program
+from user_profile.models import Profile
+from .models import notify_users
+
+
+# Background tasks, so requests don't wait on notifications being created. Run by `manage.py run_jobs`
+
+@task("notify")
+def notify(job, user_ids, source_program_id=None, source_comment_id=None, **fields):
+    # The program or comment could have been deleted since the job was enqueued
+    if source_program_id is not None and not Program.objects.filter(program_id=source_program_id).exists():
+        return
+    if source_comment_id is not None and not Comment.objects.filter(comment_id=source_comment_id).exists():
+        return
+
+    notify_users(user_ids, key=job.id, source_program_id=source_program_id, source_comment_id=source_comment_id, **fields)
+
+
+@task("notify_subscribers")
+def notify_subscribers(job, profile_id, **fields):
+    subscribers = Profile.objects.filter(subscriptions=profile_id).values_list("user_id", flat=True)
+    notify(job, subscribers, **fields)
+
+
+# Queues a notification for each user in user_ids
+def send_notif(user_ids, link, description, source_program=None, source_comment=None):
+    enqueue(
+        "notify",
+        user_ids=list(user_ids),
+        link=link,
+        description=description,
+        source_program_id=source_program.program_id if source_program else None,
+        source_comment_id=source_comment.comment_id if source_comment else None,
+    )
+
+
+# Queues a notification for everyone subscribed to the profile
+def send_notif_to_subscribers(profile, link, description, source_program=None):
+    enqueue(
+        "notify_subscribers",
+        profile_id=profile.profile_id,
+        link=link,
+        description=description,
+        source_program_id=source_program.program_id if source_program else None,
+    )
@@ -0,0 +1,36 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from notification.models import Notif, delete_notifs
+
+BATCH_SIZE = 1000
+USER_BATCH_SIZE = 500
+
+
+# Run this regularly (e.g. daily) to keep the notification table small. Unread notifications are kept.
+# Deletes in small batches, each its own transaction, so the site can keep writing notifications meanwhile
+class Command(BaseCommand):
+    help = "Deletes read notifications older than the given number of days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90, help="How many days to keep read notifications for.")
+
+    def handle(self, *args, **options):
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=options["days"])
+
+        # A few users at a time, so each batch is found through notif_user_created_idx instead of a table scan
+        deleted = 0
+        user_ids = User.objects.order_by("id").values_list("id", flat=True)
+        last_id = 0
+        while True:
+            batch = list(user_ids.filter(id__gt=last_id)[:USER_BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1]
+
+            notifs = Notif.objects.filter(target_user_id__in=batch, is_read=True, created__lt=cutoff)
+            deleted += delete_notifs(notifs, batch_size=BATCH_SIZE)
+
+        self.stdout.write("Deleted {} read notifications.".format(deleted))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from notification.models import actual_unread
+from user_profile.models import Profile
+
+BATCH_SIZE = 1000
+
+
+# Unread counts normally stay up to date on their own (see notification.models).
+# Run this to fix counts that have drifted, e.g. after notifications were changed in the database by hand, or comments
+# were deleted outside the comment API (see notification.models.uncount_comment_notifs)
+class Command(BaseCommand):
+    help = "Recounts the unread notifications of every user whose count is wrong."
+
+    def handle(self, *args, **options):
+        wrong = list(Profile.objects
+            .annotate(actual=actual_unread())
+            .exclude(unread_notifs=F("actual"))
+            .values_list("profile_id", flat=True)
+            .iterator())
+
+        # Recounted by the update itself, so notifications created since the check are included
+        for start in range(0, len(wrong), BATCH_SIZE):
+            Profile.objects.filter(profile_id__in=wrong[start:start + BATCH_SIZE]).update(unread_notifs=actual_unread())
+
+        self.stdout.write("Fixed the unread count of {} users.".format(len(wrong)))
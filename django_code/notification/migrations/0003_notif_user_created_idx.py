@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notification', '0002_auto_20190113_0702'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notif',
+            index=models.Index(fields=['target_user', '-created', '-notif_id'], name='notif_user_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='notif',
+            name='target_user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
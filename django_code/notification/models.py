@@ -1,32 +1,112 @@
 from __future__ import unicode_literals
 
-import random
+import base64
+import hashlib
+import itertools
+import collections
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth.models import User
 
 from comment.models import Comment
 from program.models import Program
+from user_profile.models import Profile
+from ourjseditor.util import pack_cursor, random_id, random_ids, retry_id_collisions, unpack_cursor
+from .pubsub import broker
 
 
 # 10 character random id. May conflict with comments
-CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-"
+# Not checked for collisions, create notifications with ourjseditor.util.retry_id_collisions
 def generate_notif_id():
-    id_string = ""
-    while len(id_string) < 10:
-        id_string += random.choice(CHARS)
+    return random_id(10)
 
-    try:
-        Notif.objects.get(notif_id=id_string)
-        return generate_notif_id()
-    except Notif.DoesNotExist:
-        return id_string
+
+NOTIF_BATCH_SIZE = 500
+
+
+# A notification id that's always the same for a given key and user
+def keyed_notif_id(key, user_id):
+    digest = hashlib.sha256("{}:{}".format(key, user_id).encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii")[:10] # Same characters as ourjseditor.util.CHARS
+
+
+# Adds to users' unread counts (Profile.unread_notifs). A user can be in user_ids more than once
+def add_unread(user_ids, sign=1):
+    change_unread(collections.Counter(user_ids), sign)
+
+
+# amounts is {user id: how many to add}. One UPDATE for each different amount
+def change_unread(amounts, sign=1):
+    users_by_amount = collections.defaultdict(list)
+    for user_id, amount in amounts.items():
+        users_by_amount[amount].append(user_id)
+
+    for amount, batch in users_by_amount.items():
+        Profile.objects.filter(user_id__in=batch).update(unread_notifs=F("unread_notifs") + sign * amount)
+
+    # Open notification streams in this process are updated straight away, ones in other processes by the broker's watcher
+    transaction.on_commit(lambda: broker.publish(amounts))
+
+
+def unread_count(user_id):
+    unread = Profile.objects.values_list("unread_notifs", flat=True).get(user_id=user_id)
+    return max(unread, 0)
+
+
+# The actual number of unread notifications, as an expression for a Profile query
+def actual_unread():
+    unread = (Notif.objects
+        .filter(target_user_id=OuterRef("user_id"), is_read=False)
+        .values("target_user_id")
+        .annotate(count=Count("*"))
+        .values("count"))
+    return Coalesce(Subquery(unread), 0)
+
+
+# The notifications and the unread counts are changed together
+def _create_notifs(user_ids, notif_ids, ignore_conflicts=False, **fields):
+    with transaction.atomic():
+        if ignore_conflicts:
+            # Notifications that already exist were counted when they were created. Repeated ids are the same notification
+            new = dict(zip(notif_ids, user_ids))
+            for notif_id in Notif.objects.filter(notif_id__in=list(new)).values_list("notif_id", flat=True):
+                del new[notif_id]
+            notif_ids, user_ids = list(new), list(new.values())
+
+        Notif.objects.bulk_create([
+            Notif(notif_id=notif_id, target_user_id=user_id, **fields)
+            for notif_id, user_id in zip(notif_ids, user_ids)
+        ], ignore_conflicts=ignore_conflicts)
+        add_unread(user_ids)
+
+
+# Sends the same notification to many users (e.g. every subscriber), inserting them in batches
+# user_ids can be any iterable, including a values_list queryset
+# If a key is passed, calling this again with the same key won't notify anyone twice (used by retried jobs)
+def notify_users(user_ids, key=None, **fields):
+    user_ids = iter(user_ids)
+    while True:
+        batch = list(itertools.islice(user_ids, NOTIF_BATCH_SIZE))
+        if not batch:
+            break
+
+        if key is None:
+            # A new block of ids for each attempt
+            retry_id_collisions(Notif, lambda ids: _create_notifs(batch, ids, **fields), lambda: random_ids(len(batch), 10))
+        else:
+            # Notifications that already exist were created by an earlier call
+            _create_notifs(batch, [keyed_notif_id(key, user_id) for user_id in batch], ignore_conflicts=True, **fields)
 
 
 # Create your models here.
 class Notif(models.Model):
     notif_id = models.CharField(primary_key=True, max_length=10, default=generate_notif_id)
-    target_user = models.ForeignKey(User, on_delete=models.CASCADE) # The user that gets the notification
+    target_user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False) # The user that gets the notification. Indexed by notif_user_created_idx
     link = models.CharField(max_length=50)
     is_read = models.BooleanField(default=False)
     description = models.CharField(max_length=140) # 50 for our message + 45 for a display name + 45 for a program title
@@ -34,6 +114,12 @@ class Notif(models.Model):
     source_program = models.ForeignKey(Program, blank=True, null=True, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Matches the order of get_notif_page
+        indexes = [
+            models.Index(fields=["target_user", "-created", "-notif_id"], name="notif_user_created_idx"),
+        ]
+
     def to_dict(self):
         notif_dict = {
             "id": self.notif_id,
@@ -57,3 +143,79 @@ class Notif(models.Model):
             notif_dict["preview"] = self.source_program.published_message[:100]
 
         return notif_dict
+
+
+# Call before deleting something that notifications are deleted with by CASCADE.
+# (There's no receiver for each deleted notification: that would stop Django deleting them with one query)
+def uncount_unread(notifs):
+    unread = notifs.filter(is_read=False).values("target_user_id").annotate(count=Count("notif_id")).order_by()
+    change_unread({row["target_user_id"]: row["count"] for row in unread}, sign=-1)
+
+
+# Notifications about the program, and about comments on it
+@receiver(pre_delete, sender=Program)
+def uncount_program_notifs(sender, instance, **kwargs):
+    uncount_unread(Notif.objects.filter(Q(source_program_id=instance.program_id) | Q(source_comment__program_id=instance.program_id)))
+
+
+# Notifications about the comment, and about replies to it. Called by the comment API (comment.api.comment):
+# a pre_delete receiver on Comment would also run once for every comment on a program being deleted
+def uncount_comment_notifs(comment):
+    uncount_unread(Notif.objects.filter(Q(source_comment_id=comment.comment_id) | Q(source_comment__parent_id=comment.comment_id)))
+
+
+# Marks some of a user's notifications as read (or unread) with one UPDATE. Returns how many changed
+def set_notifs_read(user, notifs, read):
+    with transaction.atomic():
+        # Only the ones this changes are counted, like the single notification PATCH
+        changed = notifs.filter(target_user_id=user.id, is_read=not read).update(is_read=read)
+        if changed:
+            Profile.objects.filter(user_id=user.id).update(unread_notifs=F("unread_notifs") + (-changed if read else changed))
+            transaction.on_commit(lambda: broker.publish([user.id]))
+    return changed
+
+
+# Deletes notifications in batches, each in its own short transaction, so the table isn't locked for long.
+# Only for read notifications: unread ones would be left in the counts (mark them read with set_notifs_read first)
+def delete_notifs(notifs, batch_size=NOTIF_BATCH_SIZE):
+    deleted = 0
+    while True:
+        batch = list(notifs.values_list("notif_id", flat=True)[:batch_size])
+        if not batch:
+            break
+        count, _ = Notif.objects.filter(notif_id__in=batch).delete()
+        deleted += count
+    return deleted
+
+
+NOTIFS_PER_PAGE = 20
+# Everything to_dict uses. Only the preview is needed from the source comment or program
+NOTIF_FIELDS = ["notif_id", "link", "is_read", "description", "created", "source_comment__content", "source_program__published_message"]
+
+
+# The user's notifications, newest first, as (notifs, next_cursor). next_cursor is None on the last page
+def get_notif_page(user, cursor=None, limit=NOTIFS_PER_PAGE):
+    notifs = (Notif.objects
+        .filter(target_user_id=user.id)
+        .select_related("source_comment", "source_program")
+        .only(*NOTIF_FIELDS))
+
+    if cursor is not None:
+        created, notif_id = unpack_cursor(cursor)
+        try:
+            created = parse_datetime(created) if isinstance(created, str) else None
+        except ValueError:
+            created = None
+        if created is None:
+            raise ValueError("Invalid cursor.")
+        notifs = notifs.filter(Q(created__lt=created) | Q(created=created, notif_id__lt=notif_id))
+
+    # One extra, to find out whether there's another page
+    notifs = list(notifs.order_by("-created", "-notif_id")[:limit + 1])
+
+    next_cursor = None
+    if len(notifs) > limit:
+        notifs = notifs[:limit]
+        next_cursor = pack_cursor(notifs[-1].created.isoformat(), notifs[-1].notif_id)
+
+    return notifs, next_cursor
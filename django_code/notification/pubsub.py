@@ -0,0 +1,75 @@
+from __future__ import unicode_literals
+
+import asyncio
+import logging
+import threading
+import time
+
+from django import db
+
+from user_profile.models import Profile
+
+logger = logging.getLogger(__name__)
+
+# How often, in seconds, the unread counts of users with an open stream are checked for changes made by other
+# processes: the WSGI server and `manage.py run_jobs`. One query per process, however many streams are open
+WATCH_INTERVAL = 2
+WATCH_BATCH_SIZE = 500
+
+
+# In-process pub/sub that wakes a user's open notification streams (see notification.stream) when their
+# unread count may have changed. publish() can be called from any thread; subscribers are asyncio.Events
+class NotifBroker():
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {} # user id -> set of (event loop, asyncio.Event)
+        self._watcher = None
+
+    # Call from the event loop the stream runs in. The event is set whenever the user's count may have changed
+    def subscribe(self, user_id):
+        event = asyncio.Event()
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), event))
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch_counts, name="notif-watcher", daemon=True)
+                self._watcher.start()
+        return event
+
+    def unsubscribe(self, user_id, event):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update([sub for sub in subscribers if sub[1] is event])
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_ids):
+        with self._lock:
+            subscribers = [sub for user_id in set(user_ids) for sub in self._subscribers.get(user_id, ())]
+        for loop, event in subscribers:
+            loop.call_soon_threadsafe(event.set)
+
+    def subscribed_users(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    # Publishes changes to the counts of subscribed users, wherever they were made
+    def _watch_counts(self):
+        counts = {}
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            try:
+                user_ids = self.subscribed_users()
+                new_counts = {}
+                for start in range(0, len(user_ids), WATCH_BATCH_SIZE):
+                    new_counts.update(Profile.objects
+                        .filter(user_id__in=user_ids[start:start + WATCH_BATCH_SIZE])
+                        .values_list("user_id", "unread_notifs"))
+                # Users that just subscribed are woken once; their stream only sends the count if it changed
+                self.publish([user_id for user_id, count in new_counts.items() if counts.get(user_id) != count])
+                counts = new_counts
+            except Exception:
+                logger.exception("Checking unread notification counts failed")
+                db.connection.close() # Reconnects on the next query
+
+
+broker = NotifBroker()
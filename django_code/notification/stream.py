@@ -0,0 +1,92 @@
+from __future__ import unicode_literals
+
+import io
+import json
+import asyncio
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.core.handlers.asgi import ASGIRequest
+
+from .models import unread_count
+from .pubsub import broker
+
+STREAM_PATH = "/api/notifs/stream"
+# Comment lines are sent this often (in seconds) when nothing has changed, so proxies don't close the connection
+KEEPALIVE_INTERVAL = 25
+
+
+# Database calls run in a thread pool, not sync_to_async's default single shared thread, so streams don't queue behind
+# each other
+@sync_to_async(thread_sensitive=False)
+def get_user_id(scope):
+    request = ASGIRequest(scope, io.BytesIO())
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    user = auth.get_user(request)
+    return user.id if user.is_authenticated else None
+
+
+async def send_json(send, data, status):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": json.dumps(data).encode("utf-8")})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+# /notifs/stream
+# Server-Sent Events: sends {"notifCount": N} as a "count" event when the stream opens and whenever the number of
+# unread notifications changes, instead of clients polling /notifs/count. Served by ourjseditor.asgi, outside of
+# Django's request handling, so an open stream is a waiting coroutine rather than a thread
+async def notif_stream(scope, receive, send):
+    if scope["method"] != "GET":
+        return await send_json(send, {"success": False, "error": "Method '{}' not allowed.".format(scope["method"])}, 405)
+
+    user_id = await get_user_id(scope)
+    if user_id is None:
+        return await send_json(send, {"success": False, "error": "Not logged in."}, 401)
+
+    changed = broker.subscribe(user_id)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    woken = None
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"), # Stops nginx holding back events
+            ],
+        })
+
+        last_count = None
+        while True:
+            # Cleared before reading the count, so a change made while it's read wakes the next wait
+            changed.clear()
+            count = await sync_to_async(unread_count, thread_sensitive=False)(user_id)
+            if count != last_count:
+                last_count = count
+                message = "event: count\ndata: {}\n\n".format(json.dumps({"notifCount": count}))
+            else:
+                message = ": keepalive\n\n"
+            await send({"type": "http.response.body", "body": message.encode("utf-8"), "more_body": True})
+
+            woken = asyncio.ensure_future(changed.wait())
+            await asyncio.wait([woken, disconnected], timeout=KEEPALIVE_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                break
+    finally:
+        broker.unsubscribe(user_id, changed)
+        for task in [woken, disconnected]:
+            if task is not None:
+                task.cancel()
@@ -3,14 +3,18 @@ import json
 from django import template
 from django.template.defaultfilters import escapejs
 
-from notification.models import Notif
+from notification.models import get_notif_page
 
 register = template.Library()
 
 
+# The first page of the user's notifications, and the cursor for the rest (see /api/notifs)
 @register.simple_tag
 def notifs_as_json(user):
-    notifs = Notif.objects.filter(target_user=user).order_by("-created")
-    notifs = [c.to_dict() for c in notifs]
+    notifs, next_cursor = get_notif_page(user)
+    notifs = {
+        "notifs": [n.to_dict() for n in notifs],
+        "nextCursor": next_cursor,
+    }
 
     return escapejs(json.dumps(notifs))
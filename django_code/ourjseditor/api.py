@@ -6,13 +6,17 @@ from django.http import HttpResponse
 from django.core.exceptions import ObjectDoesNotExist
 from django import db
 
+from . import timing
+
 
 def error(text, data=None, status=400):
     data = data or {}
     data["success"] = False
     data["error"] = text
+    with timing.measure("serialize"):
+        body = json.dumps(data)
     return HttpResponse(
-        json.dumps(data),
+        body,
         status=status,
         content_type="application/json"
     )
@@ -21,8 +25,10 @@ def error(text, data=None, status=400):
 def succeed(data=None, status=200):
     data = data or {}
     data["success"] = True
+    with timing.measure("serialize"):
+        body = json.dumps(data)
     return HttpResponse(
-        json.dumps(data),
+        body,
         status=status,
         content_type="application/json"
     )
@@ -73,3 +79,13 @@ class StandardAPIErrors():
             else:
                 return error("Method '{}' not allowed.".format(request.method), status=405)
         return new_func
+
+
+# /api/stats/timing
+# Request stats per url name, for the last few minutes. Only for staff
+@StandardAPIErrors("GET")
+def timing_stats(request):
+    if not request.user.is_staff:
+        return error("Not authorized.", status=401)
+
+    return succeed({"windowSeconds": timing.WINDOW_SECONDS, "urls": timing.histogram.dump()})
@@ -0,0 +1,28 @@
+"""
+ASGI config for ourjseditor project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ourjseditor.settings")
+django.setup(set_prefix=False)
+
+# Needs Django to be set up
+from notification.stream import STREAM_PATH, notif_stream, send_json
+
+
+# Serves only the notification stream, which is held open under asyncio. The rest of the site stays on WSGI: Django 3.2
+# runs every sync view of an ASGI process on one shared thread. Run this next to the WSGI server, e.g.
+# `uvicorn ourjseditor.asgi:application --port 8001`, and send STREAM_PATH to it from the proxy in front of both
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == STREAM_PATH:
+        return await notif_stream(scope, receive, send)
+    if scope["type"] == "http":
+        return await send_json(send, {"success": False, "error": "Not found."}, 404)
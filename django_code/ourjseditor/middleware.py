@@ -1,12 +1,14 @@
 import re
+import time
 
 from django import http
+from django.db import connection
 from django.conf import settings
 from django.urls import is_valid_path
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.deprecation import MiddlewareMixin
 
-from . import api
+from . import api, timing
 
 
 # Adapted from https://github.com/dghubble/django-unslashed/blob/master/unslashed/middleware.py
@@ -39,3 +41,27 @@ class RemoveSlashMiddleware(MiddlewareMixin):
                 query_data = re.match(r'^[^?]*(\?.*)?$', request.build_absolute_uri()).group(1) or ""
 
                 return http.HttpResponsePermanentRedirect(new_url + query_data)
+
+
+# Records query count, SQL time, serialization time and total time for every request (see timing.py)
+# Cheap enough to leave on: a few perf_counter calls per query
+class RequestTimingMiddleware():
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = timing.start_request()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timing.record_query):
+                response = self.get_response(request)
+        finally:
+            timing.end_request()
+        total_ms = (time.perf_counter() - start) * 1000
+
+        resolver_match = getattr(request, "resolver_match", None)
+        url_name = resolver_match.url_name if resolver_match and resolver_match.url_name else "unresolved"
+        timing.histogram.record(url_name, total_ms, timings)
+
+        response["Server-Timing"] = timings.server_timing(total_ms)
+        return response
@@ -42,10 +42,15 @@ INSTALLED_APPS = [
     'program',
     'comment',
     'vote',
-    'notification'
+    'notification',
+    'job',
+    'revision',
+    'search',
+    'feed'
 ]
 
 MIDDLEWARE = [
+    'ourjseditor.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,6 +102,35 @@ if DATABASES["default"]["ENGINE"] == "django.db.backends.mysql":
         "charset": "utf8mb4"
     }
 
+# Caching (see program.models.cached_listing). Shared by every process, so they all see when cached listings are
+# invalidated. A table in the database by default (created by program's migrations). Set CACHE_DIR to use files in that
+# directory instead
+CACHE_DIR = config("CACHE_DIR", default="")
+
+if CACHE_DIR:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": CACHE_DIR,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "ourjseditor_cache",
+        }
+    }
+
+# Program cards (see program.models.serialize_programs). Always in memory: entries are keyed by a version read from
+# the database, so they can't go stale. The local memory cache evicts the least recently used entries once it's full
+CACHES["cards"] = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "cards",
+    "TIMEOUT": None,
+    "OPTIONS": {"MAX_ENTRIES": config("CARD_CACHE_SIZE", default=20000, cast=int)},
+}
+
 # Email Sending:
 
 EMAIL_BACKEND = config('EMAIL_BACKEND')
@@ -0,0 +1,167 @@
+# Per-request timing, recorded by ourjseditor.middleware.RequestTimingMiddleware.
+# Each request's query count and durations are sent in a Server-Timing header, and
+# added to a rolling histogram per url name, which staff can see at /api/stats/timing
+
+import time
+import bisect
+import threading
+import contextlib
+from collections import deque
+
+# Upper bounds, in ms, of the histogram buckets. The last bucket holds everything slower
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+WINDOW_SECONDS = 10 * 60
+SLOT_SECONDS = 60
+
+_local = threading.local()
+
+
+class RequestTimings():
+    def __init__(self):
+        self.queries = 0
+        self.durations = {"db": 0.0, "serialize": 0.0} # ms
+        self.counters = {}
+
+    def add(self, name, ms):
+        self.durations[name] = self.durations.get(name, 0.0) + ms
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def server_timing(self, total_ms):
+        entries = ['db;desc="{} queries";dur={:.1f}'.format(self.queries, self.durations["db"])]
+        entries += ["{};dur={:.1f}".format(name, ms) for name, ms in self.durations.items() if name != "db"]
+        entries += ['{};desc="{}"'.format(name, value) for name, value in self.counters.items()]
+        entries.append("view;dur={:.1f}".format(total_ms))
+        return ", ".join(entries)
+
+
+def start_request():
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def end_request():
+    _local.timings = None
+
+
+# The timings of the request being handled by this thread, or None outside of a request
+def current():
+    return getattr(_local, "timings", None)
+
+
+# Adds the time spent in the with block to the current request's timings
+@contextlib.contextmanager
+def measure(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current()
+        if timings is not None:
+            timings.add(name, (time.perf_counter() - start) * 1000)
+
+
+# Adds to a counter (like cache hits) in the current request's timings
+def count(name, amount=1):
+    timings = current()
+    if timings is not None:
+        timings.count(name, amount)
+
+
+# A database execute wrapper (see connection.execute_wrapper), counting and timing queries
+def record_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings = current()
+        if timings is not None:
+            timings.queries += 1
+            timings.add("db", (time.perf_counter() - start) * 1000)
+
+
+class _Stats():
+    def __init__(self):
+        self.count = 0
+        self.queries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.durations = {}
+        self.counters = {}
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, total_ms, queries, durations, counters):
+        self.count += 1
+        self.queries += queries
+        self.total_ms += total_ms
+        self.max_ms = max(self.max_ms, total_ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, total_ms)] += 1
+        for name, ms in durations.items():
+            self.durations[name] = self.durations.get(name, 0.0) + ms
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other):
+        self.count += other.count
+        self.queries += other.queries
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        for name, ms in other.durations.items():
+            self.durations[name] = self.durations.get(name, 0.0) + ms
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        labels = ["<={}ms".format(ms) for ms in BUCKETS_MS] + [">{}ms".format(BUCKETS_MS[-1])]
+        return {
+            "count": self.count,
+            "avgQueries": round(self.queries / self.count, 2),
+            "avgMs": round(self.total_ms / self.count, 2),
+            "maxMs": round(self.max_ms, 2),
+            "avgDurationsMs": {name: round(ms / self.count, 2) for name, ms in self.durations.items()},
+            "counters": self.counters,
+            "histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+# Stats for the last WINDOW_SECONDS, kept in SLOT_SECONDS slots so old requests can be dropped cheaply
+class RollingHistogram():
+    def __init__(self, window_seconds=WINDOW_SECONDS, slot_seconds=SLOT_SECONDS):
+        self.window_seconds = window_seconds
+        self.slot_seconds = slot_seconds
+        self.slots = deque() # (slot start time, {url_name: _Stats})
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        while self.slots and self.slots[0][0] <= now - self.window_seconds:
+            self.slots.popleft()
+
+    def record(self, url_name, total_ms, timings):
+        now = time.time()
+        slot_start = now - now % self.slot_seconds
+        with self.lock:
+            self._expire(now)
+            if not self.slots or self.slots[-1][0] != slot_start:
+                self.slots.append((slot_start, {}))
+
+            slot = self.slots[-1][1]
+            if url_name not in slot:
+                slot[url_name] = _Stats()
+            slot[url_name].add(total_ms, timings.queries, timings.durations, timings.counters)
+
+    def dump(self):
+        merged = {}
+        with self.lock:
+            self._expire(time.time())
+            for _, slot in self.slots:
+                for url_name, stats in slot.items():
+                    if url_name not in merged:
+                        merged[url_name] = _Stats()
+                    merged[url_name].merge(stats)
+
+        return {url_name: stats.to_dict() for url_name, stats in merged.items()}
+
+
+histogram = RollingHistogram()
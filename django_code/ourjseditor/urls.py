@@ -14,9 +14,13 @@ from account import api as account_api
 from program import api as program_api
 from comment import api as comment_api
 from vote import api as vote_api
+from revision import api as revision_api
+from search import api as search_api
+from feed import api as feed_api
 from program.views import new_program as new_program_view
 
 from . import views
+from . import api as site_api
 
 api_urls = [
     re_path(r'^user/', include([
@@ -35,6 +39,9 @@ api_urls = [
         re_path(r'^/([-\w]{6})', include([
             re_path(r'^$', program_api.program, name="program-api"),
             re_path(r'^/forks$', program_api.forks, name="program-forks-api"),
+            re_path(r'^/descendants$', program_api.descendants, name="program-descendants-api"),
+            re_path(r'^/descendants/count$', program_api.descendant_count, name="program-descendant-count-api"),
+            re_path(r'^/ancestors$', program_api.ancestors, name="program-ancestors-api"),
             re_path(r'^/collaborators$', program_api.collaborators, name="program-collaborators-api"),
             re_path(r'^/viewers$', program_api.viewers, name="program-viewers-api"),
             re_path(r'^/comments$', comment_api.program_comments, name="progrom-comments-api"),
@@ -46,6 +53,8 @@ api_urls = [
                 ])),
             ])),
             re_path(r'^/vote$', vote_api.program_vote, name="program-vote-api"),
+            re_path(r'^/revisions$', revision_api.revision_list, name="program-revisions-api"),
+            re_path(r'^/revision/(\d+)$', revision_api.revision, name="program-revision-api"),
         ])),
         re_path(r'^s/(\w+)$', program_api.program_list, name="program-list-api"),
     ])),
@@ -60,6 +69,10 @@ api_urls = [
             re_path(r'^/count$', notif_api.notif_count, name="notif-count"),
         ])),
     ])),
+    re_path(r'^feed$', feed_api.feed, name="feed-api"),
+    re_path(r'^search$', search_api.search, name="search-api"),
+    re_path(r'^search/code$', search_api.search_code, name="search-code-api"),
+    re_path(r'^stats/timing$', site_api.timing_stats, name="timing-stats-api"),
 ]
 
 urlpatterns = [
@@ -1,28 +1,84 @@
 # A file to store miscellaneous functions that are accessed by multiple files and apps
 
-import random
+import json
+import base64
+import secrets
 
-from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 
 CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-"
 RESERVED_IDS = ["ourjse"]
+MAX_ID_ATTEMPTS = 5
 
 
-def get_id():
-    from program.models import Program
-    from user_profile.models import Profile
+# Random ids aren't checked against the database before they're used (with 64^length possible ids, they
+# almost never collide). Instead, the insert is retried with a new id if the id is taken,
+# see retry_id_collisions
+def random_id(length=6):
+    while True:
+        id_string = "".join(secrets.choice(CHARS) for _ in range(length))
+        if id_string not in RESERVED_IDS:
+            return id_string
+
+
+# A block of `count` distinct ids, for bulk inserts
+def random_ids(count, length=6):
+    ids = set()
+    while len(ids) < count:
+        ids.add(random_id(length))
+    return list(ids)
 
-    id_string = ""
-    while len(id_string) < 6:
-        id_string += random.choice(CHARS)
 
-    if (Profile.objects.filter(profile_id=id_string).exists() or
-            Program.objects.filter(program_id=id_string).exists() or
-            User.objects.filter(username=id_string).exists() or
-            id_string in RESERVED_IDS):
-        return get_id()
+# 6 character id for programs and profiles
+def get_id():
+    return random_id(6)
+
+
+# Calls insert(ids), which should insert row(s) of `model` with the ids, a list from new_ids(). If the insert fails
+# because one of the ids is already taken, it's tried again with new ids, up to MAX_ID_ATTEMPTS times.
+# Any other IntegrityError (another unique constraint, or one from a signal receiver) is raised straight away
+def retry_id_collisions(model, insert, new_ids):
+    for attempt in range(MAX_ID_ATTEMPTS):
+        ids = new_ids()
+        try:
+            # A savepoint, so a failed insert doesn't break an outer transaction
+            with transaction.atomic():
+                return insert(ids)
+        except IntegrityError:
+            # The failed insert was rolled back, so any of the ids that exist belong to other rows
+            if attempt == MAX_ID_ATTEMPTS - 1 or not model.objects.filter(pk__in=ids).exists():
+                raise
+
+
+# model.objects.create(**kwargs), with a new id from the default of the model's id field, retried if it's taken
+def create_with_random_id(model, **kwargs):
+    pk = model._meta.pk
+    return retry_id_collisions(
+        model,
+        lambda ids: model.objects.create(**{pk.name: ids[0]}, **kwargs),
+        lambda: [pk.get_default()],
+    )
+
+
+# Cursors for seek pagination are an opaque, url-safe encoding of the sort key and id of the last item on a page.
+# The value has to be JSON serializable
+def pack_cursor(value, object_id):
+    cursor = json.dumps([value, object_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+# Returns (value, object_id), or raises ValueError. The value still has to be checked by the caller
+def unpack_cursor(cursor):
+    try:
+        cursor = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, object_id = json.loads(cursor.decode("utf-8"))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+    if not isinstance(object_id, str):
+        raise ValueError("Invalid cursor.")
 
-    return id_string
+    return value, object_id
 
 
 # Gets a value from a dict and casts it to an int,
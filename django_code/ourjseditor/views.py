@@ -3,20 +3,21 @@ import json
 from django.shortcuts import render
 from django.db.models import Q
 
-from program.models import get_programs
+from program.models import cached_listing, get_programs, serialize_programs
+from feed.models import get_feed_page
 
 def index(request):
-    top_programs = get_programs("top", limit=4)
+    # The same for everyone, so it's cached until a program changes (see program.models.cached_listing)
     programs = {
-        "popular": [p.to_dict(include_code=False) for p in top_programs],
+        "popular": cached_listing("home_popular", lambda: serialize_programs(get_programs("hot", limit=4), include_code=False)),
     }
 
     if request.user.is_authenticated:
         recently_created = get_programs("new", Q(user=request.user), published_only=False, limit=3)
-        subscriptions = get_programs("new", Q(user__profile__in=request.user.profile.subscriptions.all()), limit=4)
+        subscriptions, _ = get_feed_page(request.user, limit=4)
 
-        programs["recent"] = [p.to_dict(include_code=False) for p in recently_created]
-        programs["subscriptions"] = [p.to_dict(include_code=False) for p in subscriptions]
+        programs["recent"] = serialize_programs(recently_created, include_code=False)
+        programs["subscriptions"] = serialize_programs(subscriptions, include_code=False)
 
     return render(request, 'ourjseditor/index.html', {
         "programs": json.dumps(programs)
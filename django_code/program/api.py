@@ -1,15 +1,20 @@
 import json
 import datetime
+from functools import partial
 
 from django.template.defaultfilters import escape
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
 
 from ourjseditor import api
-from ourjseditor.util import base64_to_file, get_as_int
+from ourjseditor.util import base64_to_file, create_with_random_id, get_as_int
 
-from notification.models import Notif
+from feed.jobs import add_to_feeds
+from notification.jobs import send_notif, send_notif_to_subscribers
+from revision.models import apply_delta, record_revision
 from user_profile.models import Profile
-from .models import Program, get_programs
+from .models import Program, SOURCE_FIELDS, source_hash, get_program_page, get_descendant_page, serialize_programs
 
 
 # /api/program/new
@@ -24,27 +29,54 @@ def new_program(request):
     if len(data["title"]) == 0:
         return api.error("Title is blank.")
 
-    created_program = Program.objects.create(
-        user=request.user,
-        title=data["title"],
-        html=data["html"],
-        js=data["js"],
-        css=data["css"],
-    )
+    with transaction.atomic():
+        created_program = create_with_random_id(
+            Program,
+            user=request.user,
+            title=data["title"],
+            html=data["html"],
+            js=data["js"],
+            css=data["css"],
+        )
+        record_revision(created_program, request.user)
 
     response = api.succeed({"id": created_program.program_id}, status=201)
     response["Location"] = "/program/" + created_program.program_id
     return response
 
 
+# Programs related to program_id, a page at a time (like program_list). get_page is called with cursor, limit and
+# request_user, and returns (programs, next_cursor)
+# ?limit=20&cursor=CURSOR
+def fork_list(request, program_id, get_page):
+    program = Program.objects.without_code().get(program_id=program_id)
+    if not program.can_user_view(request.user):
+        return api.error("Not authorized.", status=401)
+
+    try:
+        programs, next_cursor = get_page(
+            cursor=request.GET.get("cursor"),
+            limit=get_as_int(request.GET, "limit"),
+            request_user=request.user)
+    except ValueError as err:
+        return api.error(str(err))
+
+    return api.succeed({"programs": serialize_programs(programs, include_code=False), "nextCursor": next_cursor})
+
+
 # /api/program/PRO_ID/forks
-@api.StandardAPIErrors("POST")
+# GET lists the program's direct forks (?sort=new, like program_list), POST creates one
+@api.StandardAPIErrors("GET", "POST")
 def forks(request, program_id):
-    if request.method == "POST":
+    if request.method == "GET":
+        sort = request.GET.get("sort", "new")
+        return fork_list(request, program_id, partial(get_program_page, sort, Q(parent_id=program_id), published_only=False))
+    elif request.method == "POST":
         if not request.user.is_authenticated:
             return api.error("Not logged in.", status=401)
 
-        parent_program = Program.objects.get(program_id=program_id)
+        # Only what the fork link and notification need
+        parent_program = Program.objects.only("program_id", "user_id", "title").get(program_id=program_id)
 
         data = json.loads(request.body)
 
@@ -54,18 +86,21 @@ def forks(request, program_id):
         if len(data["title"]) == 0:
             return api.error("Title is blank.")
 
-        created_program = Program.objects.create(
-            user=request.user,
-            parent=parent_program,
-            title=data["title"],
-            html=data["html"],
-            js=data["js"],
-            css=data["css"],
-        )
+        with transaction.atomic():
+            created_program = create_with_random_id(
+                Program,
+                user=request.user,
+                parent=parent_program,
+                title=data["title"],
+                html=data["html"],
+                js=data["js"],
+                css=data["css"],
+            )
+            record_revision(created_program, request.user)
 
-        if parent_program.user != created_program.user:
-            Notif.objects.create(
-                target_user=parent_program.user,
+        if parent_program.user_id != created_program.user_id:
+            send_notif(
+                [parent_program.user_id],
                 link="/program/" + created_program.program_id,
                 description="<strong>{0}</strong> created a fork of your program, <strong>{1}</strong>".format(
                     escape(request.user.profile.display_name), escape(parent_program.title)),
@@ -76,10 +111,46 @@ def forks(request, program_id):
         return response
 
 
+# /api/program/PRO_ID/descendants
+# Forks, then forks of forks, etc. (see get_descendant_page)
+@api.StandardAPIErrors("GET")
+def descendants(request, program_id):
+    return fork_list(request, program_id, partial(get_descendant_page, program_id))
+
+
+# /api/program/PRO_ID/descendants/count
+# Only counts the descendants the user can see, so it matches /descendants
+@api.StandardAPIErrors("GET")
+def descendant_count(request, program_id):
+    program = Program.objects.without_code().get(program_id=program_id)
+    if not program.can_user_view(request.user):
+        return api.error("Not authorized.", status=401)
+
+    count = Program.objects.filter(ancestor_links__ancestor_id=program_id).visible_to(request.user).count()
+    return api.succeed({"count": count})
+
+
+# /api/program/PRO_ID/ancestors
+# The chain of programs this is a fork of, from the root down to its parent. Programs the user can't see are left out
+@api.StandardAPIErrors("GET")
+def ancestors(request, program_id):
+    program = Program.objects.without_code().get(program_id=program_id)
+    if not program.can_user_view(request.user):
+        return api.error("Not authorized.", status=401)
+
+    programs = (
+        Program.objects.without_code()
+        .visible_to(request.user)
+        .filter(descendant_links__descendant_id=program_id)
+        .order_by("-descendant_links__depth")
+    )
+    return api.succeed({"programs": serialize_programs(programs, include_code=False)})
+
+
 # /api/program/PROG_ID/collaborators
 @api.StandardAPIErrors("POST", "DELETE")
 def collaborators(request, program_id):
-    requested_program = Program.objects.get(program_id=program_id)
+    requested_program = Program.objects.without_code().get(program_id=program_id)
 
     # Any collaborator can add or remove other collaborators
     if not requested_program.can_user_edit(request.user):
@@ -103,8 +174,8 @@ def collaborators(request, program_id):
 
         # Send a notification to the program owner, if it wasn't the author who did the adding
         if request.user != requested_program.user:
-            Notif.objects.create(
-                target_user=requested_program.user,
+            send_notif(
+                [requested_program.user_id],
                 link="/program/" + requested_program.program_id,
                 description="<strong>{0}</strong> added <strong>{1}</strong> to the list of collaborators on your program, <strong>{2}</strong>.".format(
                     escape(request.user.profile.display_name), escape(user.profile.display_name), escape(requested_program.title)),
@@ -112,8 +183,8 @@ def collaborators(request, program_id):
 
         # Send a notification to the user who has been added
         # if (request.user != user):
-        Notif.objects.create(
-            target_user=user,
+        send_notif(
+            [user.id],
             link="/program/" + requested_program.program_id,
             description="<strong>{0}</strong> added you as a collaborator on the program, <strong>{1}</strong>.".format(
                 escape(request.user.profile.display_name), escape(requested_program.title)),
@@ -126,8 +197,8 @@ def collaborators(request, program_id):
         if requested_program.collaborators.filter(id=user.id).exists():
             # Send a notification to the program owner, if it wasn't the author who did the removing
             if request.user != requested_program.user:
-                Notif.objects.create(
-                    target_user=requested_program.user, # Program author
+                send_notif(
+                    [requested_program.user_id], # Program author
                     link="/program/" + requested_program.program_id,
                     description="<strong>{0}</strong> removed <strong>{1}</strong> from the list of collaborators on your program, <strong>{2}</strong>.".format(
                         escape(request.user.profile.display_name), escape(user.profile.display_name), escape(requested_program.title)),
@@ -135,8 +206,8 @@ def collaborators(request, program_id):
 
             # Send a notification to the user who was removed, unless they removed themselves
             if request.user != user:
-                Notif.objects.create(
-                    target_user=user,
+                send_notif(
+                    [user.id],
                     link="/program/" + requested_program.program_id,
                     description="<strong>{0}</strong> removed you from the list of collaborators on the program, <strong>{1}</strong>.".format(
                         escape(request.user.profile.display_name), escape(requested_program.title)),
@@ -151,7 +222,7 @@ def collaborators(request, program_id):
 # /api/program/PROG_ID/viewers
 @api.StandardAPIErrors("POST", "DELETE")
 def viewers(request, program_id):
-    requested_program = Program.objects.get(program_id=program_id)
+    requested_program = Program.objects.without_code().get(program_id=program_id)
 
     if not requested_program.is_private:
             return api.error("Cannot add/remove viewers on a public program.", status=400)
@@ -179,8 +250,8 @@ def viewers(request, program_id):
 
         # Send a notification to the program owner, if it wasn't the author who did the adding
         if request.user != requested_program.user:
-            Notif.objects.create(
-                target_user=requested_program.user,
+            send_notif(
+                [requested_program.user_id],
                 link="/program/" + requested_program.program_id,
                 description="<strong>{0}</strong> added <strong>{1}</strong> to the list of viewers on your program, <strong>{2}</strong>.".format(
                     escape(request.user.profile.display_name), escape(user.profile.display_name), escape(requested_program.title)),
@@ -188,8 +259,8 @@ def viewers(request, program_id):
 
         # Send a notification to the user who has been added
         # if (request.user != user):
-        Notif.objects.create(
-            target_user=user,
+        send_notif(
+            [user.id],
             link="/program/" + requested_program.program_id,
             description="<strong>{0}</strong> added you as a viewer on the program, <strong>{1}</strong>.".format(
                 escape(request.user.profile.display_name), escape(requested_program.title)),
@@ -206,8 +277,8 @@ def viewers(request, program_id):
         if requested_program.viewers.filter(id=user.id).exists():
             # Send a notification to the program owner, if it wasn't the author who did the removing
             if request.user != requested_program.user:
-                Notif.objects.create(
-                    target_user=requested_program.user, # Program author
+                send_notif(
+                    [requested_program.user_id], # Program author
                     link="/program/" + requested_program.program_id,
                     description="<strong>{0}</strong> removed <strong>{1}</strong> from the list of viewers on your program, <strong>{2}</strong>.".format(
                         escape(request.user.profile.display_name), escape(user.profile.display_name), escape(requested_program.title)),
@@ -215,8 +286,8 @@ def viewers(request, program_id):
 
             # Send a notification to the user who was removed, unless they removed themselves
             if request.user != user:
-                Notif.objects.create(
-                    target_user=user,
+                send_notif(
+                    [user.id],
                     link="/program/" + requested_program.program_id,
                     description="<strong>{0}</strong> removed you from the list of viewers on the program, <strong>{1}</strong>.".format(
                         escape(request.user.profile.display_name), escape(requested_program.title)),
@@ -233,7 +304,9 @@ def viewers(request, program_id):
 # /api/program/PRO_ID
 @api.StandardAPIErrors("GET", "PATCH", "DELETE")
 def program(request, program_id):
-    requested_program = Program.objects.get(program_id=program_id)
+    # Only GET sends the code back. A PATCH that changes the code loads (and saves) just the fields it assigns
+    programs = Program.objects if request.method == "GET" else Program.objects.without_code()
+    requested_program = programs.get(program_id=program_id)
     if request.method == "GET":
         if not requested_program.can_user_view(request.user):
             return api.error("Not authorized.", status=401)
@@ -256,6 +329,9 @@ def program(request, program_id):
         if "publishedMessage" in data and len(data["publishedMessage"]) > 250:
             return api.error("Publish message can't exceed 250 characters")
 
+        # Only these are written, so saves of just the code don't count as changes to the program's listing
+        changed_fields = []
+
         if "publishedMessage" in data:
             # Should it be possible to publish without an image or update the image without publishing
 
@@ -270,27 +346,19 @@ def program(request, program_id):
 
             requested_program.image = image
 
+            changed_fields += ["image", "published_message", "last_published", "hot_score"]
             requested_program.published_message = data["publishedMessage"]
             requested_program.last_published = datetime.datetime.now()
+            requested_program.refresh_hot_score()
 
             return_data["lastPublished"] = requested_program.last_published.replace(microsecond=0).isoformat() + "Z"
 
-            # Create notification for subscribers
-            subscribers = requested_program.user.profile.profile_set.all()
-            for subscriber in subscribers:
-                Notif.objects.create(
-                    target_user=subscriber.user,
-                    link="/program/" + requested_program.program_id,
-                    description="<strong>{0}</strong> just published a new program, <strong>{1}</strong>".format(
-                        escape(request.user.profile.display_name), escape(requested_program.title)), # Uses username of person publishing, not necessarily the program owner
-                    source_program=requested_program
-                )
-
         valid_props = ["html", "js", "css", "title"]
 
         for prop in valid_props:
             if prop in data:
                 setattr(requested_program, prop, data[prop])
+                changed_fields.append(prop)
 
         # only the owner can change whether it is private or not
         if "is_private" in data:
@@ -298,9 +366,54 @@ def program(request, program_id):
                 return api.error("Not authorized to change privacy status.", status=401)
 
             requested_program.is_private = data["is_private"]
+            changed_fields.append("is_private")
+
+        # The editor can send {"patches": {"js": {"base": HASH, "delta": [ops]}}} instead of a field's full text,
+        # where HASH is the hash of the code it edited (see revision.models.make_delta for the delta format)
+        patches = data.get("patches", {})
+        for field in patches:
+            if field not in SOURCE_FIELDS or field in data:
+                return api.error("Invalid patch for '{}'.".format(field))
+
+        changed_code = [field for field in SOURCE_FIELDS if field in data or field in patches]
+        with transaction.atomic():
+            # The code being replaced, read with the program locked, so concurrent saves are added to its history in order
+            old_code = {}
+            if changed_code:
+                old_code = Program.objects.select_for_update().values(*changed_code).get(program_id=program_id)
+
+            for field, patch in patches.items():
+                if source_hash(old_code[field]) != patch["base"]:
+                    # Someone else saved since the editor loaded this code. It'll have to send the full text
+                    return api.error("Program has changed.", data={"field": field}, status=409)
+                try:
+                    setattr(requested_program, field, apply_delta(old_code[field], patch["delta"]))
+                except ValueError:
+                    return api.error("Invalid patch for '{}'.".format(field))
+                changed_fields.append(field)
+
+            requested_program.save(update_fields=changed_fields)
+
+            # Create notification for subscribers. Queued in the same transaction as the save, so only once it's been saved
+            if "publishedMessage" in data:
+                send_notif_to_subscribers(
+                    requested_program.user.profile,
+                    link="/program/" + requested_program.program_id,
+                    description="<strong>{0}</strong> just published a new program, <strong>{1}</strong>".format(
+                        escape(request.user.profile.display_name), escape(requested_program.title)), # Uses username of person publishing, not necessarily the program owner
+                    source_program=requested_program
+                )
+
+            old_code = {field: text for field, text in old_code.items() if text != getattr(requested_program, field)}
+            if old_code:
+                record_revision(requested_program, request.user, old_code)
 
-        requested_program.save()
+        if "publishedMessage" in data:
+            add_to_feeds(requested_program)
 
+        # Only for the code this request wrote, hashed from the text saved under the lock. The other fields' hashes could
+        # be of someone else's newer code, and the editor would take them as the hashes of the code it has
+        return_data["hashes"] = {field: getattr(requested_program, field + "_hash") for field in changed_code}
         return api.succeed(return_data)
     elif request.method == "DELETE":
         if request.user != requested_program.user:
@@ -314,17 +427,18 @@ def program(request, program_id):
         return api.succeed()
 
 
-# /api/programs/SORT ?limit=20&offset=0
+# /api/programs/SORT ?limit=20&cursor=CURSOR (or &offset=0, for older clients)
 @api.StandardAPIErrors("GET")
 def program_list(request, sort):
+    cursor = request.GET.get("cursor")
     offset = get_as_int(request.GET, "offset")
     limit = get_as_int(request.GET, "limit")
 
     try:
-        programs = get_programs(sort, offset=offset, limit=limit)
+        programs, next_cursor = get_program_page(sort, cursor=cursor, offset=offset, limit=limit)
     except ValueError as err:
         return api.error(str(err))
 
-    program_dicts = [p.to_dict(include_code=False) for p in programs]
+    program_dicts = serialize_programs(programs, include_code=False)
 
-    return api.succeed({"sort": sort, "programs": program_dicts})
+    return api.succeed({"sort": sort, "programs": program_dicts, "nextCursor": next_cursor})
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from program.models import Program, bump_listing_version
+
+BATCH_SIZE = 1000
+
+
+# Scores normally stay up to date on their own (see Program.refresh_hot_score).
+# Run this after changing the hot ranking constants, or to fix scores that have drifted
+class Command(BaseCommand):
+    help = "Recalculates the \"hot\" ranking score of every program."
+
+    def handle(self, *args, **options):
+        programs = Program.objects.only("program_id", "total_votes", "last_published").order_by("program_id")
+
+        batch = []
+        updated = 0
+        for program in programs.iterator(chunk_size=BATCH_SIZE):
+            program.refresh_hot_score()
+            batch.append(program)
+
+            if len(batch) >= BATCH_SIZE:
+                Program.objects.bulk_update(batch, ["hot_score"])
+                updated += len(batch)
+                batch = []
+
+        Program.objects.bulk_update(batch, ["hot_score"])
+        updated += len(batch)
+
+        # bulk_update doesn't send signals. The popular rail is ordered by hot score
+        bump_listing_version()
+
+        self.stdout.write("Updated the hot score of {} programs.".format(updated))
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:36
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def count_total_votes(apps, schema_editor):
+    Program = apps.get_model("program", "Program")
+    Program.objects.update(total_votes=F("entertaining_votes") + F("artistic_votes") + F("informative_votes"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0009_private_programs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='total_votes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(
+            code=count_total_votes,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(condition=models.Q(('is_private', False), ('last_published__isnull', False)), fields=['-last_published', '-program_id'], name='program_public_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(condition=models.Q(('is_private', False), ('last_published__isnull', False)), fields=['-total_votes', '-program_id'], name='program_public_top_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(condition=models.Q(('is_private', False), ('last_published__isnull', False)), fields=['-entertaining_votes', '-program_id'], name='program_public_ent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(condition=models.Q(('is_private', False), ('last_published__isnull', False)), fields=['-artistic_votes', '-program_id'], name='program_public_art_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(condition=models.Q(('is_private', False), ('last_published__isnull', False)), fields=['-informative_votes', '-program_id'], name='program_public_inf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['user', '-created', '-program_id'], name='program_user_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['user', '-total_votes', '-program_id'], name='program_user_top_idx'),
+        ),
+    ]
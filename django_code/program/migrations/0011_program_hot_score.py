@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:37
+
+import math
+import datetime
+
+from django.db import migrations, models
+
+
+# Copy of program.models.calculate_hot_score when this migration was written
+def calculate_hot_score(total_votes, published):
+    order = math.log10(max(total_votes, 1))
+    seconds = (published - datetime.datetime(2017, 1, 1)).total_seconds()
+    return round(order + seconds / (2 * 24 * 60 * 60), 7)
+
+
+def score_published_programs(apps, schema_editor):
+    Program = apps.get_model("program", "Program")
+    programs = list(Program.objects.filter(last_published__isnull=False).only("program_id", "total_votes", "last_published"))
+    for program in programs:
+        program.hot_score = calculate_hot_score(program.total_votes, program.last_published)
+    Program.objects.bulk_update(programs, ["hot_score"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0010_total_votes_and_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(
+            code=score_published_programs,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(condition=models.Q(('is_private', False), ('last_published__isnull', False)), fields=['-hot_score', '-program_id'], name='program_public_hot_idx'),
+        ),
+    ]
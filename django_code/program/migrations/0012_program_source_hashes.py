@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:43
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_sources(apps, schema_editor):
+    Program = apps.get_model("program", "Program")
+    last_id = ""
+    while True:
+        # In batches, so every program's code isn't in memory at once
+        batch = list(Program.objects.filter(program_id__gt=last_id).order_by("program_id").only("program_id", "html", "js", "css")[:500])
+        if not batch:
+            break
+
+        for program in batch:
+            for field in ["html", "js", "css"]:
+                setattr(program, field + "_hash", hashlib.sha256(getattr(program, field).encode("utf-8")).hexdigest()[:32])
+        Program.objects.bulk_update(batch, ["html_hash", "js_hash", "css_hash"])
+        last_id = batch[-1].program_id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0011_program_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='css_hash',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='html_hash',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='js_hash',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.RunPython(
+            code=hash_sources,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_fork_links(apps, schema_editor):
+    Program = apps.get_model("program", "Program")
+    ForkLink = apps.get_model("program", "ForkLink")
+
+    parents = dict(Program.objects.filter(parent__isnull=False).values_list("program_id", "parent_id"))
+
+    links = []
+    for program_id, parent_id in parents.items():
+        # Walk up to the root. `seen` guards against a (shouldn't-happen) cycle
+        ancestor_id, depth, seen = parent_id, 1, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            links.append(ForkLink(ancestor_id=ancestor_id, descendant_id=program_id, depth=depth))
+            seen.add(ancestor_id)
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+    ForkLink.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0012_program_source_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForkLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['parent', '-created', '-program_id'], name='program_parent_new_idx'),
+        ),
+        migrations.AddField(
+            model_name='forklink',
+            name='ancestor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='program.program'),
+        ),
+        migrations.AddField(
+            model_name='forklink',
+            name='descendant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='program.program'),
+        ),
+        migrations.AddConstraint(
+            model_name='forklink',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='forklink_unique_pair'),
+        ),
+        migrations.RunPython(build_fork_links, migrations.RunPython.noop),
+    ]
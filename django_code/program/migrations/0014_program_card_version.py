@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0013_fork_links'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='card_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0014_program_card_version'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='program',
+            name='program_public_new_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='program',
+            name='program_public_top_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='program',
+            name='program_public_ent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='program',
+            name='program_public_art_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='program',
+            name='program_public_inf_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='program',
+            name='program_public_hot_idx',
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['-last_published', '-program_id'], name='program_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['-total_votes', '-program_id'], name='program_top_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['-hot_score', '-program_id'], name='program_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['-entertaining_votes', '-program_id'], name='program_ent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['-artistic_votes', '-program_id'], name='program_art_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['-informative_votes', '-program_id'], name='program_inf_idx'),
+        ),
+    ]
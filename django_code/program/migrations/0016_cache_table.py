@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:02
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+# Cached listings are kept in the database by default (see settings.CACHES), so `migrate` is enough to set them up.
+# Does nothing for other cache backends, or if the table already exists
+def create_cache_table(apps, schema_editor):
+    call_command("createcachetable", database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0015_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            code=create_cache_table,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0016_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forklink',
+            index=models.Index(fields=['ancestor', 'depth', 'descendant'], name='forklink_descendants_idx'),
+        ),
+    ]
@@ -1,12 +1,22 @@
 from __future__ import unicode_literals
 
-from django.db import models
-from django.db.models import F
+import math
+import time
+import hashlib
+import datetime
+
+from django.db import models, transaction
+from django.db.models import F, Q, prefetch_related_objects
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.core.cache import cache, caches
 from django.core.files.storage import FileSystemStorage
+from django.utils.dateparse import parse_datetime
 
 from vote.models import vote_types
-from ourjseditor.util import get_id
+from ourjseditor import timing
+from ourjseditor.util import get_id, pack_cursor, unpack_cursor
 
 
 def generate_id():
@@ -27,6 +37,51 @@ class OverwriteStorage(FileSystemStorage):
         return name
 
 
+SOURCE_FIELDS = ["html", "js", "css"]
+
+
+class ProgramQuerySet(models.QuerySet):
+    # Filters down to programs `user` can see, in a single query (see Program.can_user_view)
+    # Anonymous users (or None) only get public programs
+    def visible_to(self, user):
+        if user is None or not user.is_authenticated:
+            return self.filter(is_private=False)
+
+        # Subqueries rather than joins on the many-to-many tables, so programs aren't duplicated
+        collaborating = Program.collaborators.through.objects.filter(user_id=user.id).values("program_id")
+        viewing = Program.viewers.through.objects.filter(user_id=user.id).values("program_id")
+
+        return self.filter(
+            Q(is_private=False) |
+            Q(user_id=user.id) |
+            Q(program_id__in=collaborating) |
+            Q(program_id__in=viewing)
+        )
+
+    # The source fields can be hundreds of KB each, so anything that doesn't send the code leaves them in the database
+    # Assigning to a deferred field and saving still works: Django only updates the fields that were loaded
+    def without_code(self):
+        return self.defer(*SOURCE_FIELDS)
+
+
+# Stored for each source field, so the code can be cached by clients (ETags) without being read from the database
+def source_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+# "Hot" ranking: the log of a program's votes, plus a bonus that grows with its publish time.
+# Newer programs outrank older ones with the same votes, without ever recalculating old scores.
+# A program needs ten times the votes to rank with one published HOT_DECAY_SECONDS later
+HOT_EPOCH = datetime.datetime(2017, 1, 1)
+HOT_DECAY_SECONDS = 2 * 24 * 60 * 60
+
+
+def calculate_hot_score(total_votes, published):
+    order = math.log10(max(total_votes, 1))
+    seconds = (published - HOT_EPOCH).total_seconds()
+    return round(order + seconds / HOT_DECAY_SECONDS, 7)
+
+
 class Program(models.Model):
     program_id = models.CharField(primary_key=True, max_length=6, default=generate_id)
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=get_default_user)
@@ -44,10 +99,76 @@ class Program(models.Model):
     html = models.TextField(blank=True)
     js = models.TextField(blank=True)
     css = models.TextField(blank=True)
+    # See source_hash. Kept up to date by save()
+    html_hash = models.CharField(max_length=32, blank=True)
+    js_hash = models.CharField(max_length=32, blank=True)
+    css_hash = models.CharField(max_length=32, blank=True)
 
     entertaining_votes = models.IntegerField(default=0)
     artistic_votes = models.IntegerField(default=0)
     informative_votes = models.IntegerField(default=0)
+    total_votes = models.IntegerField(default=0) # Sum of the above, stored so "top" sorts can use an index
+    hot_score = models.FloatField(default=0) # See calculate_hot_score. Updated on publish and on votes
+    card_version = models.PositiveIntegerField(default=0) # Bumped when the program's card changes. See serialize_programs
+
+    objects = ProgramQuerySet.as_manager()
+
+    class Meta:
+        # Match the sorts in get_programs (ties are broken by program_id).
+        # Site-wide listings read these in order, skipping unpublished and private programs as they go.
+        # They aren't partial indexes (MySQL drops the condition), or prefixed by is_private: Django writes
+        # is_private=False as `NOT is_private`, which neither SQLite nor MySQL can seek on, and logged in users also see
+        # some private programs. User listings are prefixed by user. Checked by program.tests
+        indexes = [
+            models.Index(fields=["-last_published", "-program_id"], name="program_new_idx"),
+            models.Index(fields=["-total_votes", "-program_id"], name="program_top_idx"),
+            models.Index(fields=["-hot_score", "-program_id"], name="program_hot_idx"),
+            models.Index(fields=["-entertaining_votes", "-program_id"], name="program_ent_idx"),
+            models.Index(fields=["-artistic_votes", "-program_id"], name="program_art_idx"),
+            models.Index(fields=["-informative_votes", "-program_id"], name="program_inf_idx"),
+            models.Index(fields=["user", "-created", "-program_id"], name="program_user_new_idx"),
+            models.Index(fields=["user", "-total_votes", "-program_id"], name="program_user_top_idx"),
+            models.Index(fields=["parent", "-created", "-program_id"], name="program_parent_new_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Deferred fields haven't been loaded, so can't have changed
+        deferred = self.get_deferred_fields()
+        for field in SOURCE_FIELDS:
+            if field not in deferred:
+                setattr(self, field + "_hash", source_hash(getattr(self, field)))
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = set(update_fields) | {field + "_hash" for field in SOURCE_FIELDS if field in update_fields}
+        elif not self._state.adding and not kwargs.get("force_insert"):
+            # card_version is only changed by UPDATEs in the database (see invalidate_cards). Saving an older copy of
+            # the program would set it back, and cards cached for the versions after that would be served again
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "card_version" and field.attname not in deferred]
+
+        super(Program, self).save(*args, **kwargs)
+
+    # Call after changing votes or last_published. Unpublished programs aren't ranked
+    def refresh_hot_score(self):
+        if self.last_published is None:
+            self.hot_score = 0
+        else:
+            self.hot_score = calculate_hot_score(self.total_votes, self.last_published)
+
+    # Changes a vote count with a single UPDATE of the counter columns, so simultaneous votes aren't lost,
+    # and the rest of the row (including the code) isn't rewritten
+    def add_votes(self, vote_type, amount):
+        field = vote_type + "_votes"
+        programs = Program.objects.filter(program_id=self.program_id)
+        programs.update(**{field: F(field) + amount, "total_votes": F("total_votes") + amount, "card_version": F("card_version") + 1})
+
+        # The hot score depends on the new total, which might include other votes cast at the same time
+        count, self.total_votes, self.last_published = programs.values_list(field, "total_votes", "last_published").get()
+        setattr(self, field, count)
+        self.refresh_hot_score()
+        programs.update(hot_score=self.hot_score)
+        bump_listing_version()
 
     def can_user_edit(self, user):
         return (
@@ -63,16 +184,25 @@ class Program(models.Model):
         )
 
     def to_dict(self, include_code=True):
+        return self._to_dict(
+            include_code,
+            parent_title=Program.objects.values_list("title", flat=True).filter(program_id=self.parent_id).first() if self.parent_id is not None else None,
+            collaborators=list(self.collaborators.order_by("id").values_list("profile__profile_id", flat=True)),
+            viewers=list(self.viewers.order_by("id").values_list("profile__profile_id", flat=True)),
+        )
+
+    # Shared by to_dict and serialize_programs, which look up the related data differently
+    def _to_dict(self, include_code, parent_title, collaborators, viewers):
         if self.last_published:
             last_published = self.last_published.replace(microsecond=0).isoformat() + "Z"
         else:
             last_published = None
 
-        parent = self.parent
-        if parent is not None:
+        parent = None
+        if self.parent_id is not None:
             parent = {
                 "id": self.parent_id,
-                "title": self.parent.title
+                "title": parent_title
             }
 
         program_dict = {
@@ -92,8 +222,8 @@ class Program(models.Model):
             "lastPublished": last_published,
             "thumbnailUrl": self.image.url,
 
-            "collaborators": list(self.collaborators.values_list("profile__profile_id", flat=True)),
-            "viewers": list(self.viewers.values_list("profile__profile_id", flat=True)),
+            "collaborators": collaborators,
+            "viewers": viewers,
 
             "votes": {t: getattr(self, t + "_votes") for t in vote_types}
         }
@@ -102,63 +232,352 @@ class Program(models.Model):
             program_dict["js"] = self.js
             program_dict["html"] = self.html
             program_dict["css"] = self.css
+            # The base for patch saves (see program.api.program)
+            program_dict["hashes"] = {field: getattr(self, field + "_hash") for field in SOURCE_FIELDS}
 
         return program_dict
 
+
+# The fork tree, as a closure table: a row for every (ancestor, descendant) pair, not just parent and child.
+# So descendants, ancestors and descendant counts are each one indexed lookup, however deep the tree is.
+# Kept up to date by the signals below
+class ForkLink(models.Model):
+    ancestor = models.ForeignKey(Program, on_delete=models.CASCADE, related_name="descendant_links", db_index=False) # Indexed by the constraint
+    descendant = models.ForeignKey(Program, on_delete=models.CASCADE, related_name="ancestor_links")
+    depth = models.PositiveIntegerField() # 1 for a fork of ancestor, 2 for a fork of a fork, etc.
+
+    class Meta:
+        # Also the index for counting descendants. The ForeignKey index on descendant finds ancestors
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="forklink_unique_pair"),
+        ]
+        # In the order get_descendant_page lists them
+        indexes = [
+            models.Index(fields=["ancestor", "depth", "descendant"], name="forklink_descendants_idx"),
+        ]
+
+
+@receiver(post_save, sender=Program)
+def add_fork_links(sender, instance, created, raw=False, **kwargs):
+    if not created or raw or instance.parent_id is None:
+        return
+
+    # A fork's ancestors are its parent, and its parent's ancestors
+    links = [ForkLink(ancestor_id=instance.parent_id, descendant=instance, depth=1)]
+    for ancestor_id, depth in ForkLink.objects.filter(descendant_id=instance.parent_id).values_list("ancestor_id", "depth"):
+        links.append(ForkLink(ancestor_id=ancestor_id, descendant=instance, depth=depth + 1))
+    ForkLink.objects.bulk_create(links)
+
+
+@receiver(pre_delete, sender=Program)
+def remove_fork_links(sender, instance, **kwargs):
+    # Forks of a deleted program become roots (Program.parent is SET_NULL), so the deleted program's ancestors
+    # are no longer ancestors of anything below it. Links to the program itself are deleted by CASCADE
+    subtree = ForkLink.objects.filter(ancestor_id=instance.program_id).values("descendant_id")
+    ancestors = ForkLink.objects.filter(descendant_id=instance.program_id).values("ancestor_id")
+    ForkLink.objects.filter(descendant_id__in=subtree, ancestor_id__in=ancestors).delete()
+
+
+# Cached listings (like the home page's popular rail) are stored under a version number, which is bumped whenever
+# something shown in a program card could have changed. Entries for old versions are never read again, and expire
+LISTING_VERSION_KEY = "program_listing_version"
+# Seconds. Also limits how stale a listing gets if a bump is lost (the database cache's incr isn't atomic)
+LISTING_TIMEOUT = 10 * 60
+
+
+def listing_version():
+    version = cache.get(LISTING_VERSION_KEY)
+    if version is None:
+        # If the key was evicted, the new version still has to be higher than any earlier one
+        cache.add(LISTING_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(LISTING_VERSION_KEY)
+    return version
+
+
+# Bumped once the current transaction commits, so a listing cached in the meantime can't hold the old data
+# under the new version
+def bump_listing_version():
+    transaction.on_commit(_incr_listing_version)
+
+
+def _incr_listing_version():
+    try:
+        cache.incr(LISTING_VERSION_KEY)
+    except ValueError: # Not in the cache. listing_version() starts a new one
+        pass
+
+
+# Returns the cached value of make_value() for `key`, for the current listing version
+def cached_listing(key, make_value):
+    key = "{}:{}".format(key, listing_version())
+    value = cache.get(key)
+    if value is None:
+        value = make_value()
+        cache.set(key, value, LISTING_TIMEOUT)
+    return value
+
+
+# Changes what serialize_programs(include_code=False) returns for `programs` (a queryset)
+def invalidate_cards(programs):
+    programs.update(card_version=F("card_version") + 1)
+
+
+# Program cards and listings show the author's username and display name. Call after changing either
+def invalidate_author(user):
+    invalidate_cards(Program.objects.filter(user=user))
+    bump_listing_version()
+
+
+# Saves of just the code don't change anything listings show. (Votes bump the versions in add_votes)
+@receiver(post_save, sender=Program)
+def program_saved(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    code_fields = set(SOURCE_FIELDS) | {field + "_hash" for field in SOURCE_FIELDS}
+    if raw or (update_fields is not None and set(update_fields) <= code_fields):
+        return
+
+    bump_listing_version()
+    if not created:
+        # Forks' cards show their parent's title
+        changed = Q(program_id=instance.program_id)
+        if update_fields is None or "title" in update_fields:
+            changed |= Q(parent_id=instance.program_id)
+        invalidate_cards(Program.objects.filter(changed))
+
+
+@receiver(pre_delete, sender=Program)
+def invalidate_fork_cards(sender, instance, **kwargs):
+    # Before Program.parent is SET_NULL on the forks
+    invalidate_cards(Program.objects.filter(parent_id=instance.program_id))
+
+
+@receiver(post_delete, sender=Program)
+def program_deleted(sender, instance, **kwargs):
+    bump_listing_version()
+
+
+# instance is always the program: these have no reverse accessor on User
+@receiver(m2m_changed, sender=Program.collaborators.through)
+@receiver(m2m_changed, sender=Program.viewers.through)
+def program_users_changed(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_cards(Program.objects.filter(program_id=instance.program_id))
+        bump_listing_version()
+
+
+# Program cards (to_dict(include_code=False)) are cached under the program's id and card_version. The version is read
+# with the program, so a card is never out of date, and a cache per process is fine (see settings.CACHES).
+# The least recently used cards are evicted once the cache is full
+CARD_CACHE = "cards"
+
+
+# Same output as calling to_dict on each program, but with a constant number of queries,
+# instead of several per program. Use this for anything that serializes a list of programs
+def serialize_programs(programs, include_code=True):
+    if isinstance(programs, models.QuerySet):
+        programs = programs.select_related("user__profile")
+    programs = list(programs)
+
+    if include_code:
+        return _serialize_programs(programs, include_code)
+
+    card_cache = caches[CARD_CACHE]
+    keys = {p.program_id: "card:{}:{}".format(p.program_id, p.card_version) for p in programs}
+    cards = card_cache.get_many(keys.values())
+
+    missing = [p for p in programs if keys[p.program_id] not in cards]
+    timing.count("card_cache_hits", len(programs) - len(missing))
+    timing.count("card_cache_misses", len(missing))
+    if missing:
+        new_cards = {keys[p.program_id]: card for p, card in zip(missing, _serialize_programs(missing, include_code))}
+        card_cache.set_many(new_cards)
+        cards.update(new_cards)
+
+    return [cards[keys[p.program_id]] for p in programs]
+
+
+def _serialize_programs(programs, include_code):
+    # Authors that are already loaded (e.g. by select_related) aren't fetched again
+    prefetch_related_objects(programs, "user__profile")
+
+    program_ids = [p.program_id for p in programs]
+    parent_ids = {p.parent_id for p in programs if p.parent_id is not None}
+
+    parent_titles = {}
+    if parent_ids:
+        parent_titles = dict(Program.objects.filter(program_id__in=parent_ids).values_list("program_id", "title"))
+
+    # program_id -> list of profile ids, in the same order to_dict uses
+    def profile_ids_by_program(through):
+        by_program = {program_id: [] for program_id in program_ids}
+        rows = (through.objects
+            .filter(program_id__in=program_ids)
+            .order_by("user_id")
+            .values_list("program_id", "user__profile__profile_id"))
+        for program_id, profile_id in rows:
+            by_program[program_id].append(profile_id)
+        return by_program
+
+    collaborators = {}
+    viewers = {}
+    if program_ids:
+        collaborators = profile_ids_by_program(Program.collaborators.through)
+        viewers = profile_ids_by_program(Program.viewers.through)
+
+    with timing.measure("serialize"):
+        return [p._to_dict(
+            include_code,
+            parent_title=parent_titles.get(p.parent_id),
+            collaborators=collaborators[p.program_id],
+            viewers=viewers[p.program_id],
+        ) for p in programs]
+
+
 PROGRAMS_PER_PAGE = 20
 
+# Maps public names (top, new, hot, entertaining, etc.) to the field the database sorts by (total_votes, created, hot_score, entertaining_votes)
+def get_sort_field(sort, published_only=True):
+    if sort == "top":
+        return "total_votes"
+    elif sort == "hot":
+        return "hot_score"
+    elif sort == "new":
+        return "last_published" if published_only else "created"
+    elif sort in vote_types:
+        return sort + "_votes"
+    raise ValueError("Invalid Sort.")
+
+
+# Cursors encode the sort key and id of the last program on a page (see ourjseditor.util.pack_cursor).
+# program_id breaks ties, so every program has a unique position in a sort
+def encode_cursor(sort_field, program):
+    value = getattr(program, sort_field)
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+
+    return pack_cursor(value, program.program_id)
+
+
+def decode_cursor(sort_field, cursor):
+    value, program_id = unpack_cursor(cursor)
+
+    if sort_field in ("created", "last_published"):
+        try:
+            value = parse_datetime(value) if isinstance(value, str) else None
+        except ValueError: # Well formatted, but not a real date
+            value = None
+    elif sort_field == "hot_score":
+        value = float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    elif isinstance(value, bool) or not isinstance(value, int):
+        value = None
+
+    if value is None:
+        raise ValueError("Invalid cursor.")
+
+    return value, program_id
+
+
+# The unsliced queryset behind get_programs and get_program_page, with ties broken by program_id
+def _sorted_programs(sort, filters, published_only, request_user, cursor):
+    sort_field = get_sort_field(sort, published_only)
+    programs = Program.objects.without_code()
+
+    if published_only:
+        programs = programs.filter(last_published__isnull=False)
+
+    if filters:
+        programs = programs.filter(filters)
+
+    # Anonymous users (and request_user=None) only see public programs
+    programs = programs.visible_to(request_user)
+
+    # Seek past the last program of the previous page, instead of counting through every earlier row.
+    # The __lte is redundant, but lets the database start from the cursor in the sort's index instead of using the OR
+    if cursor is not None:
+        value, program_id = decode_cursor(sort_field, cursor)
+        programs = programs.filter(
+            Q(**{sort_field + "__lte": value}),
+            Q(**{sort_field + "__lt": value}) | Q(program_id__lt=program_id)
+        )
+
+    return programs.order_by("-" + sort_field, "-program_id"), sort_field
+
+
+# None is the case where limit isn't passed
+# limit and offset are user input that have been parsed to `int` (or None), but haven't been validated
+def _clean_limit(limit):
+    if limit is None or limit <= 0:
+        return PROGRAMS_PER_PAGE
+    return min(limit, PROGRAMS_PER_PAGE + 1)
+
+
 # Called from:
-#   - program/view.program_list; get the first 20 programs by a sort
-#   - program/api.program_list; get programs with offset and limit
-#   - view and api for user program list, need sort, offset, and limit options
 #   - home page, getting 3 most recently edited programs (limit, sort, user, unpublished), 3 popular programs, 4 programs from subscriptions
-#   TODO: to get spin-offs of a given program
+#   - get_program_page, for the program list pages and apis (program/view.program_list, program/api.program_list, user program lists)
+#   - program/api fork_list, for a program's forks and descendants (filtered on parent and ForkLink)
 
 # filters is a Q object
 # e.g. get_programs("top", Q(author=User.objects.get(username="Matthias")), published_only=True)
-def get_programs(sort, filters=None, offset=0, limit=PROGRAMS_PER_PAGE, published_only=True, initial_load=False, request_user=None):
-    programs = Program.objects
+def get_programs(sort, filters=None, offset=0, limit=PROGRAMS_PER_PAGE, published_only=True, request_user=None, cursor=None):
+    limit = _clean_limit(limit)
 
-    # None is the case where limit isn't passed
-    # limit and offset are user input that have been parsed to `int` (or None), but haven't been validated
-    if limit is None or limit <= 0:
-        limit = PROGRAMS_PER_PAGE
-    if limit > PROGRAMS_PER_PAGE + 1:
-        limit = PROGRAMS_PER_PAGE + 1
+    if offset is None or offset < 0 or cursor is not None:
+        offset = 0
 
-    if offset is None or offset < 0:
+    programs, _ = _sorted_programs(sort, filters, published_only, request_user, cursor)
+    return programs[offset:offset+limit]
+
+
+# Like get_programs, but returns (programs, next_cursor). next_cursor is None on the last page.
+# Pass a cursor to get the next page; offset is still accepted for old clients
+def get_program_page(sort, filters=None, cursor=None, offset=0, limit=PROGRAMS_PER_PAGE, published_only=True, request_user=None):
+    limit = _clean_limit(limit)
+
+    if offset is None or offset < 0 or cursor is not None:
         offset = 0
 
-    # If get_programs is called with limit=21 and initial_load=True, then limit would be 22, but that should never happen
-    if initial_load:
-        limit += 1
+    programs, sort_field = _sorted_programs(sort, filters, published_only, request_user, cursor)
+    # Load one extra program to find out whether there's another page
+    programs = list(programs[offset:offset+limit+1])
+
+    next_cursor = None
+    if len(programs) > limit:
+        programs = programs[:limit]
+        next_cursor = encode_cursor(sort_field, programs[-1])
+
+    return programs, next_cursor
+
+
+# The unsliced queryset behind get_descendant_page. Forks come first, then forks of forks and so on, in the order of
+# forklink_descendants_idx. Each program has its depth below program_id as fork_depth
+def _descendant_programs(program_id, request_user, cursor):
+    # In one filter(), so the conditions are all on the same link
+    links = Q(ancestor_links__ancestor_id=program_id)
+    if cursor is not None:
+        depth, descendant_id = unpack_cursor(cursor)
+        if isinstance(depth, bool) or not isinstance(depth, int):
+            raise ValueError("Invalid cursor.")
+        # The __gte is redundant, but lets the database start from the cursor in the index (see _sorted_programs)
+        links &= Q(ancestor_links__depth__gte=depth) & (
+            Q(ancestor_links__depth__gt=depth) | Q(ancestor_links__descendant_id__gt=descendant_id)
+        )
 
-    if published_only:
-        programs = programs.filter(last_published__isnull=False)
+    return (Program.objects.without_code()
+        .filter(links)
+        .visible_to(request_user)
+        .annotate(fork_depth=F("ancestor_links__depth"))
+        .order_by("ancestor_links__depth", "ancestor_links__descendant_id"))
 
-    if filters:
-        programs = programs.filter(filters)
 
-    # if it's an anonymous user, private programs are automatically filtered out
-    if request_user == None:
-        programs = programs.filter(is_private=False)
-    else:
-        # TODO: this could possibly be used in a DDoS attack
-        # TODO: there is probably a better way to do this
-        program_ids = [program.program_id for program in programs if program.can_user_view(request_user)]
-        programs = programs.filter(program_id__in=program_ids)
+# A page of the descendants of program_id that request_user can see, as (programs, next_cursor) like get_program_page
+def get_descendant_page(program_id, cursor=None, limit=PROGRAMS_PER_PAGE, request_user=None):
+    limit = _clean_limit(limit)
 
-    # Maps public names (top, new, hot, entertaining, etc.) to names the database understands (total_votes, created, hotness?, entertaining_votes)
-    if sort == "top":
-        programs = programs.annotate(total_votes=F("informative_votes") + F("artistic_votes") + F("entertaining_votes"))
-        sort = "-total_votes"
-    elif sort == "new":
-        sort = "-last_published" if published_only else "-created"
-    elif sort in vote_types:
-        sort = "-" + sort + "_votes"
-    else:
-        raise ValueError("Invalid Sort.")
+    # Load one extra program to find out whether there's another page
+    programs = list(_descendant_programs(program_id, request_user, cursor)[:limit + 1])
 
-    programs = programs.order_by(sort)[offset:offset+limit]
+    next_cursor = None
+    if len(programs) > limit:
+        programs = programs[:limit]
+        next_cursor = pack_cursor(programs[-1].fork_depth, programs[-1].program_id)
 
-    return programs
+    return programs, next_cursor
@@ -666,17 +666,53 @@ function displayComment (comment) {
     return com;
 }
 
+//Replies loaded along with each comment. Threads with more than this are loaded when they're unfolded
+var INLINE_REPLIES = 3;
+
+//Loads a page of comments. cursor is null for the first page
+function loadComments (cursor) {
+    var req = new XMLHttpRequest();
+    req.open("GET", "/api/program/" + programData.id + "/comments?replies=" + INLINE_REPLIES + (cursor ? "&cursor=" + encodeURIComponent(cursor) : ""));
+    req.addEventListener("load", function () {
+        var data = JSON.parse(this.response);
+        if (data && data.success) {
+            for (var i = 0; i < data.comments.length; i++) {
+                //If that's the whole thread, unfolding it doesn't need another request
+                if (data.comments[i].replies.length === data.comments[i].replyCount) {
+                    data.comments[i].comments = data.comments[i].replies;
+                }
+                delete data.comments[i].replies;
+            }
+
+            programData.commentCursor = data.nextCursor;
+            if (cursor) {
+                addComments(data.comments);
+            }else {
+                displayComments(data.comments);
+            }
+        }
+    });
+    req.send();
+}
+
 function displayComments (comments) {
-    programData.comments = comments;
+    programData.comments = [];
 
     var base = document.getElementById("comment-wrap");
 
     base.appendChild(createCommentTextbox(null));
 
-    for (var i = 0; i < comments.length; i++) {
-        base.appendChild(displayComment(comments[i]));
-    }
-
+    var loadMore = document.createElement("div");
+    loadMore.setAttribute("id", "load-more-comments");
+    loadMore.classList.add("comment-content");
+    var loadMoreLink = document.createElement("a");
+    loadMoreLink.innerText = "Load more comments";
+    loadMoreLink.addEventListener("click", function (e) {
+        e.preventDefault();
+        loadMore.style.display = "none";
+        loadComments(programData.commentCursor);
+    });
+    base.appendChild(loadMore).appendChild(loadMoreLink);
 
     var noCommentsMessage = document.createElement("div");
     noCommentsMessage.setAttribute("id", "no-comments-message");
@@ -688,9 +724,21 @@ function displayComments (comments) {
         noCommentsMessage.style.display = "none";
     }
 
+    addComments(comments);
+
     hashUpdated();
 }
 
+//Adds a page of comments after the ones that have already been loaded
+function addComments (comments) {
+    var loadMore = document.getElementById("load-more-comments");
+    for (var i = 0; i < comments.length; i++) {
+        programData.comments.push(comments[i]);
+        loadMore.parentNode.insertBefore(displayComment(comments[i]), loadMore);
+    }
+    loadMore.style.display = programData.commentCursor ? "" : "none";
+}
+
 function hashUpdated() {
     var scrollCommentId = window.location.hash.slice(1);
     var scrollComment = document.getElementById(scrollCommentId);
@@ -703,12 +751,11 @@ function hashUpdated() {
             if (this.status === 200) {
                 var data = JSON.parse(this.response);
                 for (var i = 0; i < programData.comments.length; i++) {
-                    if (programData.comments[i].id === data.parent.id) {
+                    if (data.parent && programData.comments[i].id === data.parent.id) {
+                        unfoldComment(programData.comments[i], scrollCommentId);
                         break;
                     }
                 }
-
-                unfoldComment(programData.comments[i], scrollCommentId);
             }
         });
         req.send();
@@ -991,6 +1038,59 @@ function vote () {
     }));
 }
 
+//Code as of the last confirmed save, with the hashes the server gave it: {js: {code: "", hash: ""}, ...}
+var SOURCE_FIELDS = ["js", "css", "html"];
+var savedCode = {};
+var saveInFlight = false;
+
+//Only the fields in hashes are updated. A save only gets back hashes for the code it wrote; the others stay as they
+//were, so if someone else changed them, the next patch's base doesn't match and the server sends a 409
+function setSavedCode (code, hashes) {
+    SOURCE_FIELDS.forEach(function (field) {
+        if (hashes[field] !== undefined) {
+            savedCode[field] = { code: code[field], hash: hashes[field] };
+        }
+    });
+}
+
+//Splits after each line break, the same way as Python's str.splitlines(True), which the server uses
+var LINE_REGEX = /[^\n\r\v\f\x1c-\x1e\x85\u2028\u2029]*(?:\r\n|[\n\r\v\f\x1c-\x1e\x85\u2028\u2029])|[^\n\r\v\f\x1c-\x1e\x85\u2028\u2029]+$/g;
+function splitLines (text) {
+    return text.match(LINE_REGEX) || [];
+}
+
+//A delta (see revision/models.py on the server) replacing the lines between the unchanged start and end of the code.
+//Editing one spot of a big program sends just the lines around it
+function makeDelta (oldText, newText) {
+    var oldLines = splitLines(oldText);
+    var newLines = splitLines(newText);
+
+    var start = 0;
+    while (start < oldLines.length && start < newLines.length && oldLines[start] === newLines[start]) {
+        start++;
+    }
+    var end = 0;
+    while (end < oldLines.length - start && end < newLines.length - start &&
+            oldLines[oldLines.length - 1 - end] === newLines[newLines.length - 1 - end]) {
+        end++;
+    }
+
+    var delta = [];
+    if (start > 0) {
+        delta.push(start);
+    }
+    if (oldLines.length - start - end > 0) {
+        delta.push(start + end - oldLines.length);
+    }
+    if (newLines.length - start - end > 0) {
+        delta.push(newLines.slice(start, newLines.length - end).join(""));
+    }
+    if (end > 0) {
+        delta.push(end);
+    }
+    return delta;
+}
+
 function save (fork, isPrivate) {
     let isPrivateJson = {};
 
@@ -1000,7 +1100,19 @@ function save (fork, isPrivate) {
     programData.html = htmlEditor.getValue();    
 
     var req = new XMLHttpRequest();
+    req.addEventListener("loadend", function () {
+        saveInFlight = false;
+    });
     req.addEventListener("load", function (evt) {
+        //The program changed since our last save (maybe in another tab), so the patch doesn't apply. Send everything
+        if (this.status === 409) {
+            savedCode = {};
+            save(fork, isPrivate);
+            return;
+        }
+        if (this.status < 400 && isUpdate) {
+            setSavedCode(sentCode, JSON.parse(this.response).hashes);
+        }
         //Something went wrong:
         if (this.status >= 400) {
             var contentType = this.getResponseHeader("content-type").toLowerCase();
@@ -1031,16 +1143,34 @@ function save (fork, isPrivate) {
 
     var toSend = {
         "title" : programData.title,
-        "js" : programData.js,
-        "css" : programData.css,
-        "html" : programData.html,
         ...isPrivateJson
-    }; 
+    };
+
+    //Saves to an existing program only send what changed since the last save the server confirmed.
+    //While a save is still on its way, the next one sends the full code, since its base isn't confirmed yet
+    var isUpdate = !fork && programData.id && !programData.unsaved;
+    var patching = isUpdate && !saveInFlight;
+    var sentCode = {};
+    SOURCE_FIELDS.forEach(function (field) {
+        sentCode[field] = programData[field];
+        if (patching && savedCode[field]) {
+            if (savedCode[field].code !== programData[field]) {
+                toSend.patches = toSend.patches || {};
+                toSend.patches[field] = {
+                    "base" : savedCode[field].hash,
+                    "delta" : makeDelta(savedCode[field].code, programData[field])
+                };
+            }
+        }else {
+            toSend[field] = programData[field];
+        }
+    });
 
     if (isPrivate !== undefined) {
         toSend.is_private = isPrivate;
     }
 
+    saveInFlight = true;
     req.send(JSON.stringify(toSend));
 }
 
@@ -1197,6 +1327,9 @@ document.addEventListener("DOMContentLoaded", function() {
     cssEditor.setValue(programData.css, -1);
     htmlEditor.setValue(programData.html, -1);
     document.getElementById("program-title").innerText = programData.title;
+    if (programData.hashes) {
+        setSavedCode(programData, programData.hashes);
+    }
 
     //TODO: Maybe add a login check/pop-up here
     if (programData.canEditProgram) {
@@ -1286,15 +1419,7 @@ window.addEventListener("load", function () {
 
     //Only bring in comments if it's not an unsaved program
     if (!programData.unsaved) {
-        var req = new XMLHttpRequest();
-        req.open("GET", "/api/program/" + programData.id + "/comments");
-        req.addEventListener("load", function () {
-            var data = JSON.parse(this.response);
-            if (data && data.success) {
-                displayComments(data.comments);
-            }
-        });
-        req.send();
+        loadComments(null);
     }
 
     window.addEventListener("hashchange", hashUpdated);
@@ -0,0 +1,75 @@
+from __future__ import unicode_literals
+
+import datetime
+import unittest
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+
+from ourjseditor.util import pack_cursor
+from .models import Program, PROGRAMS_PER_PAGE, get_programs, get_sort_field, encode_cursor, _descendant_programs
+
+SORTS = ["new", "top", "hot", "entertaining", "artistic", "informative"]
+
+
+# The listing sorts should read an index in order (see Program.Meta.indexes), rather than sorting every matching row
+@unittest.skipUnless(connection.vendor == "sqlite", "Uses SQLite's EXPLAIN QUERY PLAN")
+class ListingIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice")
+
+    def assertUsesIndex(self, programs):
+        sql, params = programs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            # Rows are (id, parent, notused, detail). Only the outer query matters, not the visibility subqueries
+            plan = [row[3] for row in cursor.fetchall() if row[1] == 0]
+
+        self.assertTrue(any("USING INDEX" in step or "USING COVERING INDEX" in step for step in plan), plan)
+        self.assertFalse(any("USE TEMP B-TREE" in step for step in plan), plan)
+
+    # A later page, seeking past the last program of the first
+    def cursor_after(self, sort, published_only=True):
+        program = Program(
+            program_id="abcdef",
+            user=self.user,
+            created=datetime.datetime(2020, 1, 1),
+            last_published=datetime.datetime(2020, 1, 1),
+            total_votes=3,
+            hot_score=1.5,
+            entertaining_votes=1,
+            artistic_votes=1,
+            informative_votes=1,
+        )
+        return encode_cursor(get_sort_field(sort, published_only), program)
+
+    def test_public_listings(self):
+        for sort in SORTS:
+            for request_user in [None, self.user]:
+                with self.subTest(sort=sort, logged_in=request_user is not None):
+                    self.assertUsesIndex(get_programs(sort, request_user=request_user))
+                    self.assertUsesIndex(get_programs(sort, request_user=request_user, cursor=self.cursor_after(sort)))
+
+    # Profiles list programs sorted by new (your own) or top (everyone else's)
+    def test_user_listings(self):
+        for sort in ["new", "top"]:
+            for request_user in [None, self.user]:
+                with self.subTest(sort=sort, logged_in=request_user is not None):
+                    filters = Q(user=self.user)
+                    cursor = self.cursor_after(sort, published_only=False)
+                    self.assertUsesIndex(get_programs(sort, filters, published_only=False, request_user=request_user))
+                    self.assertUsesIndex(get_programs(sort, filters, published_only=False, request_user=request_user,
+                        cursor=cursor))
+
+    def test_fork_listing(self):
+        program = Program.objects.create(program_id="abcdef", user=self.user)
+        self.assertUsesIndex(get_programs("new", Q(parent_id=program.program_id), published_only=False))
+
+    def test_descendant_listing(self):
+        for request_user in [None, self.user]:
+            for cursor in [None, pack_cursor(2, "abcdef")]:
+                with self.subTest(logged_in=request_user is not None, cursor=cursor is not None):
+                    self.assertUsesIndex(_descendant_programs("abcdef", request_user, cursor)[:PROGRAMS_PER_PAGE + 1])
@@ -3,18 +3,25 @@ from __future__ import unicode_literals
 import json
 import re
 import os
+import hashlib
 
 from django.shortcuts import render, redirect
 from django.http import HttpResponse
 from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.gzip import gzip_page
 
-from program.models import Program, get_programs, PROGRAMS_PER_PAGE
+from program.models import Program, get_program_page, serialize_programs, PROGRAMS_PER_PAGE, SOURCE_FIELDS
 from vote.models import Vote, vote_types
 
 with open(os.path.join(os.path.dirname(__file__), 'templates.json'), "r") as data_file:
     data_str = re.sub(r"\\\n", r"\\n", data_file.read())
     program_templates = json.loads(data_str)
 
+# Part of the fullscreen page's ETag, so cached pages are replaced when a deploy changes the page around the program
+with open(os.path.join(os.path.dirname(__file__), 'templates', 'program', 'fullscreen.html'), "rb") as page_file:
+    fullscreen_version = hashlib.sha256(page_file.read() + settings.MEDIA_URL.encode("utf-8")).hexdigest()[:32]
+
 
 def get_template(key):
     try:
@@ -64,15 +71,16 @@ def program_list(request, sort):
         sort = "new" # Default sort. sort is actually passed in as None, so we can't use an argument default
 
     try:
-        programs = get_programs(sort, initial_load=True) # Load and pass one extra program on initial load
+        programs, next_cursor = get_program_page(sort)
     except ValueError:
         return redirect("/programs")
 
-    program_dicts = [p.to_dict(include_code=False) for p in programs]
+    program_dicts = serialize_programs(programs, include_code=False)
 
     return render(request, "program/list.html", {
         "listOptions": json.dumps({
             "initialPrograms": program_dicts,
+            "nextCursor": next_cursor,
             "perPage": PROGRAMS_PER_PAGE,
             "sort": sort
         })
@@ -86,13 +94,35 @@ CONTENT_TYPES = {
 }
 
 
+# Responds with 304 Not Modified if the client (or a CDN) already has the version matching etag,
+# otherwise with make_response(). Caches always have to revalidate, so changes to the code show up immediately
+def cached_source_response(request, etag, is_private, make_response):
+    etag = '"{}"'.format(etag)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = make_response()
+
+    response["ETag"] = etag
+    # Private programs can't be stored by shared caches
+    patch_cache_control(response, no_cache=True, **{"private" if is_private else "public": True})
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+@gzip_page
 def program_file(request, program_id, file_type):
+    # Only the hash is needed to check whether the client's copy is up to date
     try:
-        requested_program = Program.objects.get(program_id=program_id)
+        file_hash, is_private = Program.objects.values_list(file_type + "_hash", "is_private").get(program_id=program_id)
     except Program.DoesNotExist:
         return HttpResponse("404: No program found with that id", status=404)
 
-    return HttpResponse(getattr(requested_program, file_type), content_type=CONTENT_TYPES[file_type])
+    def make_response():
+        code = Program.objects.values_list(file_type, flat=True).get(program_id=program_id)
+        return HttpResponse(code, content_type=CONTENT_TYPES[file_type])
+
+    return cached_source_response(request, file_hash, is_private, make_response)
 
 
 def new_program(request):
@@ -105,22 +135,32 @@ def new_program(request):
     return render(request, "program/new-program.html", {"template_descriptions": json.dumps(template_descriptions)})
 
 
+@gzip_page
 def fullscreen(request, program_id):
+    hash_fields = [field + "_hash" for field in SOURCE_FIELDS]
     try:
-        requested_program = Program.objects.get(program_id=program_id)
+        program_info = Program.objects.values("title", "is_private", *hash_fields).get(program_id=program_id)
     except Program.DoesNotExist:
         return render(request, "program/404.html", status=404)
 
-    data_dict = {
-        "id": requested_program.program_id,
+    # Changes whenever the code, title, page template or MEDIA_URL do
+    page_hash = hashlib.sha256(":".join([fullscreen_version, program_info["title"]] + [program_info[f] for f in hash_fields]).encode("utf-8")).hexdigest()[:32]
 
-        "js": requested_program.js,
-        "html": requested_program.html,
-        "css": requested_program.css,
-        "title": requested_program.title,
-    }
+    def make_response():
+        requested_program = Program.objects.only("program_id", "title", *SOURCE_FIELDS).get(program_id=program_id)
 
-    return render(request, "program/fullscreen.html", {
-        "data_dict": json.dumps(data_dict),
-        "MEDIA_URL": settings.MEDIA_URL
-    })
+        data_dict = {
+            "id": requested_program.program_id,
+
+            "js": requested_program.js,
+            "html": requested_program.html,
+            "css": requested_program.css,
+            "title": requested_program.title,
+        }
+
+        return render(request, "program/fullscreen.html", {
+            "data_dict": json.dumps(data_dict),
+            "MEDIA_URL": settings.MEDIA_URL
+        })
+
+    return cached_source_response(request, page_hash, program_info["is_private"], make_response)
@@ -0,0 +1,46 @@
+from __future__ import unicode_literals
+
+from program.models import Program
+from ourjseditor import api
+from ourjseditor.util import get_as_int
+from .models import Revision, get_revision
+
+REVISIONS_PER_PAGE = 50
+
+
+# /api/program/PRO_ID/revisions ?before=NUMBER&limit=50
+# Newest first. Pass the last number of a page as `before` to get the next one
+@api.StandardAPIErrors("GET")
+def revision_list(request, program_id):
+    program = Program.objects.without_code().get(program_id=program_id)
+    if not program.can_user_view(request.user):
+        return api.error("Not authorized.", status=401)
+
+    before = get_as_int(request.GET, "before")
+    limit = get_as_int(request.GET, "limit")
+    if limit is None or limit <= 0 or limit > REVISIONS_PER_PAGE:
+        limit = REVISIONS_PER_PAGE
+
+    revisions = Revision.objects.select_related("user__profile").defer("data").filter(program_id=program_id)
+    if before is not None:
+        revisions = revisions.filter(number__lt=before)
+    revisions = list(revisions.order_by("-number")[:limit])
+
+    return api.succeed({
+        "revisions": [r.to_dict() for r in revisions],
+        "complete": len(revisions) < limit,
+    })
+
+
+# /api/program/PRO_ID/revision/NUMBER
+@api.StandardAPIErrors("GET")
+def revision(request, program_id, number):
+    program = Program.objects.without_code().get(program_id=program_id)
+    if not program.can_user_view(request.user):
+        return api.error("Not authorized.", status=401)
+
+    requested_revision, code = get_revision(program_id, int(number))
+
+    revision_dict = requested_revision.to_dict()
+    revision_dict.update(code)
+    return api.succeed(revision_dict)
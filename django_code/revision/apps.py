@@ -0,0 +1,4 @@
+from django.apps import AppConfig
+
+class RevisionConfig(AppConfig):
+    name = u"revision"
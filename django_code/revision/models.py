@@ -0,0 +1,148 @@
+from __future__ import unicode_literals
+
+import json
+import zlib
+import difflib
+
+from django.contrib.auth.models import User
+from django.db import models
+
+from program.models import Program, SOURCE_FIELDS
+
+# Every SNAPSHOT_INTERVAL-th revision (1, 51, 101, ...) stores the program's full code. The revisions in between store
+# a delta from the revision before, so history grows with the size of each edit, and rebuilding any revision replays
+# fewer than SNAPSHOT_INTERVAL deltas
+SNAPSHOT_INTERVAL = 50
+
+
+# A delta is a list of operations on the old text's lines, applied in order:
+# a positive int copies that many lines, a negative int skips that many, and a string is inserted
+def make_delta(old, new):
+    old_lines = old.splitlines(True)
+    new_lines = new.splitlines(True)
+
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append("".join(new_lines[j1:j2]))
+    return ops
+
+
+def apply_delta(old, ops):
+    return "".join(apply_delta_to_lines(old.splitlines(True), ops))
+
+
+# apply_delta, on text that's already been split into lines. Returns the new lines, so a chain of deltas can be
+# replayed without joining and resplitting the whole text at every step.
+# (The lines only match new.splitlines() when inserts end in a newline, which is always true of make_delta's deltas)
+def apply_delta_to_lines(old_lines, ops):
+    # Deltas can come from the editor (see program.api.program), so are checked
+    if not isinstance(ops, list):
+        raise ValueError("Delta isn't a list.")
+
+    position = 0
+
+    new_lines = []
+    for op in ops:
+        if isinstance(op, bool) or not isinstance(op, (int, str)):
+            raise ValueError("Invalid delta operation.")
+        if isinstance(op, int):
+            if op > 0:
+                new_lines.extend(old_lines[position:position + op])
+            position += abs(op)
+        else:
+            new_lines.extend(op.splitlines(True))
+
+    if position > len(old_lines):
+        raise ValueError("Delta doesn't match the text.")
+    # Lines that the delta doesn't mention are kept
+    new_lines.extend(old_lines[position:])
+    return new_lines
+
+
+def pack(data):
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def is_snapshot_number(number):
+    return (number - 1) % SNAPSHOT_INTERVAL == 0
+
+
+class Revision(models.Model):
+    program = models.ForeignKey(Program, on_delete=models.CASCADE)
+    number = models.PositiveIntegerField() # Counts up from 1 for each program
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True) # Who saved it. None for code from before revisions were kept
+    created = models.DateTimeField(auto_now_add=True)
+
+    is_snapshot = models.BooleanField(default=False)
+    # zlib-compressed JSON. Snapshots have all of the code ({"html": "...", "js": "...", "css": "..."}),
+    # other revisions only have deltas for the fields that changed ({"js": [ops]})
+    data = models.BinaryField()
+
+    class Meta:
+        # Also the index for listing a program's revisions, and for rebuilding one
+        constraints = [
+            models.UniqueConstraint(fields=["program", "number"], name="revision_unique_number"),
+        ]
+
+    def to_dict(self):
+        return {
+            "number": self.number,
+            "created": self.created.replace(microsecond=0).isoformat() + "Z",
+            "author": self.user.profile.profile_id if self.user_id is not None else None,
+            "isSnapshot": self.is_snapshot,
+        }
+
+
+# Call after saving a program whose code changed (or was created), inside the transaction that saved it,
+# with the program's row locked so that concurrent saves are numbered (and diffed against each other) in order.
+# old_code maps each changed source field to its text before the save, or is None for a new program.
+def record_revision(program, user, old_code=None):
+    last = Revision.objects.filter(program=program).order_by("-number").values_list("number", flat=True).first()
+    number = (last or 0) + 1
+
+    deferred = program.get_deferred_fields()
+    if number == 1 or is_snapshot_number(number):
+        code = {field: getattr(program, field) for field in SOURCE_FIELDS if field not in deferred}
+        missing = [field for field in SOURCE_FIELDS if field in deferred]
+        if missing:
+            code.update(Program.objects.values(*missing).get(program_id=program.program_id))
+
+    if number == 1 and old_code is not None:
+        # The program predates revision history, so its old code becomes the first revision
+        Revision.objects.create(program=program, number=1, user=None, is_snapshot=True, data=pack(dict(code, **old_code)))
+        number = 2
+
+    if is_snapshot_number(number):
+        return Revision.objects.create(program=program, number=number, user=user, is_snapshot=True, data=pack(code))
+
+    deltas = {field: make_delta(old, getattr(program, field)) for field, old in old_code.items()}
+    return Revision.objects.create(program=program, number=number, user=user, is_snapshot=False, data=pack(deltas))
+
+
+# Returns the revision, and a dict of its code, in a single query of at most SNAPSHOT_INTERVAL rows
+def get_revision(program_id, number):
+    snapshot_number = number - (number - 1) % SNAPSHOT_INTERVAL
+    revisions = list(
+        Revision.objects
+        .select_related("user__profile")
+        .filter(program_id=program_id, number__gte=snapshot_number, number__lte=number)
+        .order_by("number")
+    )
+    if not revisions or revisions[-1].number != number:
+        raise Revision.DoesNotExist("Revision {0} of {1} doesn't exist.".format(number, program_id))
+
+    lines = {field: text.splitlines(True) for field, text in unpack(revisions[0].data).items()}
+    for revision in revisions[1:]:
+        for field, ops in unpack(revision.data).items():
+            lines[field] = apply_delta_to_lines(lines[field], ops)
+    return revisions[-1], {field: "".join(field_lines) for field, field_lines in lines.items()}
@@ -0,0 +1,57 @@
+from __future__ import unicode_literals
+
+from program.models import Program, serialize_programs
+from ourjseditor import api
+from ourjseditor.util import get_as_int
+from .models import search_programs, search_program_code
+
+RESULTS_PER_PAGE = 20
+
+
+# /api/search?q=QUERY&offset=0&limit=20
+# Searches program titles, published messages and comments. Results are ranked, so are paged by offset
+@api.StandardAPIErrors("GET")
+def search(request):
+    query = request.GET.get("q", "")
+
+    offset = get_as_int(request.GET, "offset")
+    if offset is None or offset < 0:
+        offset = 0
+    limit = get_as_int(request.GET, "limit")
+    if limit is None or limit <= 0 or limit > RESULTS_PER_PAGE:
+        limit = RESULTS_PER_PAGE
+
+    # One extra, to find out whether there's another page
+    program_ids = search_programs(query, request.user, offset, limit + 1)
+    more = len(program_ids) > limit
+    program_ids = program_ids[:limit]
+
+    programs = Program.objects.without_code().in_bulk(program_ids)
+    programs = [programs[program_id] for program_id in program_ids if program_id in programs]
+
+    return api.succeed({
+        "programs": serialize_programs(programs, include_code=False),
+        "nextOffset": offset + limit if more else None,
+    })
+
+
+# /api/search/code?q=TEXT&limit=20&cursor=CURSOR
+# Programs with TEXT (at least 3 characters) anywhere in their HTML, JS or CSS
+@api.StandardAPIErrors("GET")
+def search_code(request):
+    limit = get_as_int(request.GET, "limit")
+    if limit is None or limit <= 0 or limit > RESULTS_PER_PAGE:
+        limit = RESULTS_PER_PAGE
+
+    try:
+        program_ids, next_cursor = search_program_code(request.GET.get("q", ""), request.user, request.GET.get("cursor"), limit)
+    except ValueError as err:
+        return api.error(str(err))
+
+    programs = Program.objects.without_code().in_bulk(program_ids)
+    programs = [programs[program_id] for program_id in program_ids if program_id in programs]
+
+    return api.succeed({
+        "programs": serialize_programs(programs, include_code=False),
+        "nextCursor": next_cursor,
+    })
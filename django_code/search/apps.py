@@ -0,0 +1,4 @@
+from django.apps import AppConfig
+
+class SearchConfig(AppConfig):
+    name = u"search"
@@ -0,0 +1,14 @@
+from __future__ import unicode_literals
+
+from job.models import task
+from program.models import Program
+from .models import index_code
+
+
+# Background tasks, so saving a program doesn't wait on its code being indexed. Run by `manage.py run_jobs`
+
+@task("index_code")
+def index_program_code(job, program_id):
+    # The program could have been deleted since the job was enqueued
+    if Program.objects.filter(program_id=program_id).exists():
+        index_code(program_id)
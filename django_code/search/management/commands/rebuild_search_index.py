@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from program.models import Program
+from comment.models import Comment
+from search.models import SearchDocument, index_code, index_document
+
+BATCH_SIZE = 1000
+
+
+# The index normally stays up to date on its own (see the signals in search.models), and the migrations index what was
+# there before. Run this to repair it, or to fill CodeTrigram on databases other than SQLite
+class Command(BaseCommand):
+    help = "Adds every program, comment and program's code to the search indexes, and updates outdated entries."
+
+    def handle(self, *args, **options):
+        programs = Program.objects.only("program_id", "title", "published_message").order_by("program_id")
+        for program in programs.iterator(chunk_size=BATCH_SIZE):
+            index_document(program.program_id, None, program.title, program.published_message)
+
+        comments = Comment.objects.only("comment_id", "program_id", "content").order_by("comment_id")
+        for comment in comments.iterator(chunk_size=BATCH_SIZE):
+            index_document(comment.program_id, comment.comment_id, "", comment.content)
+
+        self.stdout.write("Indexed {} documents.".format(SearchDocument.objects.count()))
+
+        for program_id in Program.objects.order_by("created").values_list("program_id", flat=True).iterator():
+            index_code(program_id)
+        self.stdout.write("Indexed the code of every program.")
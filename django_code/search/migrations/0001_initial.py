@@ -0,0 +1,73 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# An external content FTS5 table: the text is only stored in search_searchdocument, and the triggers keep the index
+# in sync with it (including deletes by CASCADE)
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE search_fts USING fts5(title, body, content='search_searchdocument', content_rowid='id')",
+    # The rank column: bm25, with search.models.TITLE_WEIGHT and BODY_WEIGHT
+    "INSERT INTO search_fts(search_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    """CREATE TRIGGER search_fts_insert AFTER INSERT ON search_searchdocument BEGIN
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER search_fts_delete AFTER DELETE ON search_searchdocument BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER search_fts_update AFTER UPDATE ON search_searchdocument BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+
+# Other databases use SearchTerm instead (see search.models.use_fts)
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in FTS_SQL:
+            schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for trigger in ["search_fts_insert", "search_fts_delete", "search_fts_update"]:
+            schema_editor.execute("DROP TRIGGER " + trigger)
+        schema_editor.execute("DROP TABLE search_fts")
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('program', '0013_fork_links'),
+        ('comment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=45)),
+                ('body', models.TextField(blank=True)),
+                ('comment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='comment.comment')),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='program.program')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=40)),
+                ('weight', models.IntegerField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='search.searchdocument')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(condition=models.Q(('comment', None)), fields=('program',), name='searchdocument_one_per_program'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# An FTS5 trigram index over the code. Its rowids are CodeDocument ids, and search.models.index_code keeps it up to
+# date. It stores its own copy of the code: an external-content table would need a view and triggers on the program
+# table, which SQLite drops or breaks whenever a migration rebuilds that table
+CODE_FTS_SQL = [
+    "CREATE VIRTUAL TABLE search_code_fts USING fts5(html, js, css, tokenize='trigram')",
+    # Index the existing programs, oldest first
+    """INSERT INTO search_codedocument(program_id) SELECT program_id FROM program_program ORDER BY created""",
+    """INSERT INTO search_code_fts(rowid, html, js, css)
+        SELECT d.id, p.html, p.js, p.css FROM search_codedocument d JOIN program_program p ON p.program_id = d.program_id""",
+]
+
+
+# Other databases use CodeTrigram, filled by `manage.py rebuild_search_index` (see search.models.use_fts)
+def create_code_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in CODE_FTS_SQL:
+            schema_editor.execute(statement)
+
+
+def drop_code_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE search_code_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('program', '0013_fork_links'),
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='program.program')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CodeDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('program', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='program.program')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='codetrigram',
+            constraint=models.UniqueConstraint(fields=('trigram', 'program'), name='codetrigram_unique'),
+        ),
+        migrations.RunPython(create_code_fts, drop_code_fts),
+    ]
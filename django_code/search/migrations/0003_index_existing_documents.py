@@ -0,0 +1,74 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:20
+
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Copies of search.models' TITLE_WEIGHT, BODY_WEIGHT and tokenize when this migration was written
+TITLE_WEIGHT = 10
+BODY_WEIGHT = 1
+WORD_REGEX = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return WORD_REGEX.findall(text.lower())
+
+
+# Lists the ids first, so the tables aren't read while they're being written to
+def batches(queryset, fields):
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield queryset.model.objects.filter(pk__in=ids[start:start + BATCH_SIZE]).only(*fields)
+
+
+# Adds documents for the programs and comments from before search was added (later ones are indexed when they're
+# saved). On SQLite, search_fts's triggers index them. Other databases get their SearchTerms here
+def index_existing_documents(apps, schema_editor):
+    Program = apps.get_model("program", "Program")
+    Comment = apps.get_model("comment", "Comment")
+    SearchDocument = apps.get_model("search", "SearchDocument")
+    SearchTerm = apps.get_model("search", "SearchTerm")
+
+    programs = Program.objects.exclude(program_id__in=SearchDocument.objects.filter(comment=None).values("program_id"))
+    for batch in batches(programs, ["program_id", "title", "published_message"]):
+        SearchDocument.objects.bulk_create([
+            SearchDocument(program_id=program.program_id, title=program.title, body=program.published_message)
+            for program in batch
+        ])
+
+    comments = Comment.objects.exclude(comment_id__in=SearchDocument.objects.filter(comment__isnull=False).values("comment_id"))
+    for batch in batches(comments, ["comment_id", "program_id", "content"]):
+        SearchDocument.objects.bulk_create([
+            SearchDocument(program_id=comment.program_id, comment_id=comment.comment_id, body=comment.content)
+            for comment in batch
+        ])
+
+    if schema_editor.connection.vendor == "sqlite":
+        return
+
+    for batch in batches(SearchDocument.objects.filter(searchterm=None), ["id", "title", "body"]):
+        terms = []
+        for document in batch:
+            weights = {}
+            for text, weight in [(document.title, TITLE_WEIGHT), (document.body, BODY_WEIGHT)]:
+                for term in tokenize(text):
+                    term = term[:40]
+                    weights[term] = weights.get(term, 0) + weight
+            terms += [SearchTerm(document_id=document.id, term=t, weight=w) for t, w in weights.items()]
+        SearchTerm.objects.bulk_create(terms, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_code_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            code=index_existing_documents,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,306 @@
+from __future__ import unicode_literals
+
+import re
+
+from django.db import connection, models
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from job.models import enqueue
+from program.models import Program, SOURCE_FIELDS
+from comment.models import Comment
+
+# Matches in titles count for more than matches in published messages and comments
+TITLE_WEIGHT = 10
+BODY_WEIGHT = 1
+
+MAX_QUERY_TERMS = 8
+# The fewest matching documents read for a page of results (see _search_fts)
+MIN_FTS_DOCUMENTS = 200
+# Code searches look at up to MAX_COUNTED_TRIGRAMS of the text's trigrams, and use the rarest MAX_CODE_TRIGRAMS of those
+# to find candidates. Every candidate is then checked for the whole text, so using fewer only costs speed
+MAX_COUNTED_TRIGRAMS = 16
+MAX_CODE_TRIGRAMS = 4
+# Posting lists are only counted up to this, to find the rarest trigrams without reading the common ones in full
+TRIGRAM_COUNT_LIMIT = 1000
+WORD_REGEX = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return WORD_REGEX.findall(text.lower())
+
+
+# On SQLite, documents are indexed by an FTS5 table (search_fts, see migrations/0001_initial), which triggers keep in
+# sync with SearchDocument. Other databases use SearchTerm, an inverted index built in Python
+def use_fts():
+    return connection.vendor == "sqlite"
+
+
+# What gets searched: one per program (its title and published message), and one per comment.
+# A migration that alters this model on SQLite rebuilds its table, which drops search_fts's triggers: recreate them after
+class SearchDocument(models.Model):
+    program = models.ForeignKey(Program, on_delete=models.CASCADE)
+    comment = models.OneToOneField(Comment, on_delete=models.CASCADE, blank=True, null=True)
+
+    title = models.CharField(max_length=45, blank=True) # Blank for comments
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["program"], condition=Q(comment=None), name="searchdocument_one_per_program"),
+        ]
+
+
+class SearchTerm(models.Model):
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE)
+    term = models.CharField(max_length=40, db_index=True)
+    weight = models.IntegerField() # TITLE_WEIGHT or BODY_WEIGHT for each time the term appears
+
+
+# Code search. On SQLite, programs' code is copied into search_code_fts (an FTS5 trigram index, see
+# migrations/0002_code_search), with its CodeDocument's id as the rowid. Other databases use CodeTrigram.
+# Both are updated by index_code. (Not by triggers on the program table: SQLite migrations rebuild tables, which drops them)
+class CodeDocument(models.Model):
+    program = models.OneToOneField(Program, on_delete=models.CASCADE)
+
+
+class CodeTrigram(models.Model):
+    program = models.ForeignKey(Program, on_delete=models.CASCADE)
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        # Also the index for finding the programs with a trigram
+        constraints = [
+            models.UniqueConstraint(fields=["trigram", "program"], name="codetrigram_unique"),
+        ]
+
+
+def index_document(program_id, comment_id, title, body):
+    document = SearchDocument.objects.filter(program_id=program_id, comment_id=comment_id).first()
+    if document is None:
+        document = SearchDocument.objects.create(program_id=program_id, comment_id=comment_id, title=title, body=body)
+    elif document.title == title and document.body == body:
+        # Most program saves are code changes
+        return
+    else:
+        document.title = title
+        document.body = body
+        document.save()
+
+    if not use_fts():
+        weights = {}
+        for text, weight in [(title, TITLE_WEIGHT), (body, BODY_WEIGHT)]:
+            for term in tokenize(text):
+                term = term[:40]
+                weights[term] = weights.get(term, 0) + weight
+
+        document.searchterm_set.all().delete()
+        SearchTerm.objects.bulk_create([SearchTerm(document=document, term=t, weight=w) for t, w in weights.items()])
+
+
+# Deleting a program or comment deletes its document (and terms, and FTS row) by CASCADE
+@receiver(post_save, sender=Program)
+def index_program(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_document(instance.program_id, None, instance.title, instance.published_message)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_document(instance.program_id, instance.comment_id, "", instance.content)
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def index_code(program_id):
+    code = Program.objects.values_list(*SOURCE_FIELDS).get(program_id=program_id)
+
+    if use_fts():
+        document, _ = CodeDocument.objects.get_or_create(program_id=program_id)
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM search_code_fts WHERE rowid = %s", [document.id])
+            cursor.execute("INSERT INTO search_code_fts(rowid, html, js, css) VALUES (%s, %s, %s, %s)", [document.id] + list(code))
+        return
+
+    new = set().union(*(trigrams(text) for text in code))
+    old = set(CodeTrigram.objects.filter(program_id=program_id).values_list("trigram", flat=True))
+
+    CodeTrigram.objects.filter(program_id=program_id, trigram__in=old - new).delete()
+    # Under a case- or accent-insensitive collation (like MySQL's default), trigrams such as "afé" and "afe" are the same
+    # row. Searches on those databases match them the same way anyway
+    CodeTrigram.objects.bulk_create([CodeTrigram(program_id=program_id, trigram=t) for t in new - old], batch_size=1000, ignore_conflicts=True)
+
+
+@receiver(post_save, sender=Program)
+def index_program_code(sender, instance, raw=False, **kwargs):
+    # Saves that don't load the code can't change it
+    deferred = instance.get_deferred_fields()
+    if not raw and not all(field in deferred for field in SOURCE_FIELDS):
+        # Indexed by a job, so saves don't wait on it. Saves made before the job runs share it
+        enqueue("index_code", key="index_code:{}".format(instance.program_id), program_id=instance.program_id)
+
+
+# CodeDocument and CodeTrigram are deleted by CASCADE, but the FTS table isn't a model
+@receiver(pre_delete, sender=Program)
+def remove_program_code(sender, instance, **kwargs):
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM search_code_fts WHERE rowid IN (SELECT id FROM {} WHERE program_id = %s)".format(CodeDocument._meta.db_table),
+                [instance.program_id],
+            )
+
+
+# Returns the ids of the published programs matching `query` that `user` can see, best match first (like listings,
+# unpublished programs aren't shown). Every word of the query has to match (as a prefix, on SQLite) in one of the
+# program's documents
+def search_programs(query, user, offset, limit):
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+
+    if use_fts():
+        return _search_fts(terms, user, offset, limit)
+    return _search_terms(terms, user, offset, limit)
+
+
+# Same rules as ProgramQuerySet.visible_to, written out for the raw FTS queries (with programs as `p`),
+# so SQLite checks them on the matching rows only
+def _visible_sql(user):
+    if user is None or not user.is_authenticated:
+        return "NOT p.is_private", []
+
+    sql = (
+        "NOT p.is_private"
+        " OR p.user_id = %s"
+        " OR p.program_id IN (SELECT program_id FROM {collaborators} WHERE user_id = %s)"
+        " OR p.program_id IN (SELECT program_id FROM {viewers} WHERE user_id = %s)"
+    ).format(
+        collaborators=Program.collaborators.through._meta.db_table,
+        viewers=Program.viewers.through._meta.db_table,
+    )
+    return sql, [user.id, user.id, user.id]
+
+
+def _search_fts(terms, user, offset, limit):
+    match = " AND ".join('"{}"*'.format(term) for term in terms)
+    visible, visible_params = _visible_sql(user)
+
+    # search_fts ranks with bm25, weighted by TITLE_WEIGHT and BODY_WEIGHT (set up in the migration). Lower is a better
+    # match. Every match is ranked: FTS5 handles ORDER BY rank with a LIMIT itself, keeping only the best rows (still
+    # ~200ms for a word in 100k documents, but rare words are quick).
+    # A program ranks by its best document. Documents of programs that are unpublished or that the user can't see are
+    # skipped, so the best `limit` documents may not be enough programs. Then it's asked again for four times as many.
+    # Ties in rank aren't in a fixed order, so each try starts from the best match rather than carrying on with an OFFSET
+    sql = (
+        "SELECT d.program_id, p.last_published IS NOT NULL AND ({visible})"
+        " FROM (SELECT rowid, rank FROM search_fts WHERE search_fts MATCH %s ORDER BY rank LIMIT %s) m"
+        " JOIN {documents} d ON d.id = m.rowid"
+        " JOIN {programs} p ON p.program_id = d.program_id"
+        " ORDER BY m.rank"
+    ).format(
+        documents=SearchDocument._meta.db_table,
+        programs=Program._meta.db_table,
+        visible=visible,
+    )
+
+    documents = max(MIN_FTS_DOCUMENTS, 2 * (offset + limit))
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute(sql, visible_params + [match, documents])
+            rows = cursor.fetchall()
+            program_ids = {} # Used as an ordered set
+            for program_id, is_visible in rows:
+                if is_visible:
+                    program_ids.setdefault(program_id, None)
+
+            if len(program_ids) >= offset + limit or len(rows) < documents: # Enough, or every match has been read
+                return list(program_ids)[offset:offset + limit]
+            documents *= 4
+
+
+def _search_terms(terms, user, offset, limit):
+    matches = (
+        Program.objects
+        .visible_to(user)
+        .filter(last_published__isnull=False, searchdocument__searchterm__term__in=terms)
+        .values("program_id")
+        .annotate(
+            score=Sum("searchdocument__searchterm__weight"),
+            matched=Count("searchdocument__searchterm__term", distinct=True),
+        )
+        .filter(matched=len(terms))
+        .order_by("-score", "program_id")
+    )
+    return [m["program_id"] for m in matches[offset:offset + limit]]
+
+
+# Returns (program ids, next cursor) for programs that `user` can see with `text` in their code (case-insensitive),
+# newest first on SQLite. Pass the cursor back to get the next page; it's None on the last page
+def search_program_code(text, user, cursor, limit):
+    if len(text) < 3:
+        raise ValueError("Search for at least 3 characters.")
+
+    if use_fts():
+        return _search_code_fts(text, user, cursor, limit)
+    return _search_code_trigrams(text, user, cursor, limit)
+
+
+def _search_code_fts(text, user, cursor, limit):
+    # With the trigram tokenizer, a phrase matches wherever it appears as a substring.
+    # FTS5 narrows to documents with every trigram of it, then checks them for the whole phrase
+    match = '"{}"'.format(text.replace('"', '""'))
+    visible, visible_params = _visible_sql(user)
+
+    # The cursor is the rowid of the last result (rowids count up as programs are created)
+    sql = (
+        "SELECT d.id, d.program_id"
+        " FROM search_code_fts f"
+        " JOIN {documents} d ON d.id = f.rowid"
+        " JOIN {programs} p ON p.program_id = d.program_id"
+        " WHERE search_code_fts MATCH %s AND f.rowid < %s AND ({visible})"
+        " ORDER BY f.rowid DESC"
+        " LIMIT %s"
+    ).format(documents=CodeDocument._meta.db_table, programs=Program._meta.db_table, visible=visible)
+    try:
+        before = int(cursor) if cursor else 2 ** 63 - 1
+    except ValueError:
+        raise ValueError("Invalid cursor.")
+    params = [match, before] + visible_params + [limit + 1]
+
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+
+    next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+    return [program_id for _, program_id in rows[:limit]], next_cursor
+
+
+def _search_code_trigrams(text, user, cursor, limit):
+    # Programs with the text's rarest trigrams are candidates, which are then checked for the whole text.
+    # Each trigram is a join through codetrigram_unique, so the database can start from the shortest posting list
+    # and look the program up in the others, instead of reading all of them
+    counts = {
+        gram: CodeTrigram.objects.filter(trigram=gram)[:TRIGRAM_COUNT_LIMIT].count()
+        for gram in sorted(trigrams(text))[:MAX_COUNTED_TRIGRAMS]
+    }
+    rarest = sorted(counts, key=counts.get)[:MAX_CODE_TRIGRAMS]
+    if counts[rarest[0]] == 0:
+        return [], None
+
+    programs = Program.objects.visible_to(user)
+    for gram in rarest:
+        programs = programs.filter(codetrigram__trigram=gram)
+    programs = programs.filter(Q(html__icontains=text) | Q(js__icontains=text) | Q(css__icontains=text))
+    # The cursor is the id of the last result
+    if cursor:
+        programs = programs.filter(program_id__lt=cursor)
+
+    program_ids = list(programs.order_by("-program_id").values_list("program_id", flat=True)[:limit + 1])
+    next_cursor = program_ids[limit - 1] if len(program_ids) > limit else None
+    return program_ids[:limit], next_cursor
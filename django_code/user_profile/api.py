@@ -3,7 +3,7 @@ import json
 from django.contrib.auth.models import User
 from django.db.models import Q
 
-from program.models import Program, get_programs
+from program.models import Program, get_program_page, invalidate_author, serialize_programs
 from user_profile.models import Profile, check_username
 from ourjseditor.util import get_as_int
 from ourjseditor import api
@@ -66,6 +66,9 @@ def user(request, user_id):
 
         requested_user.save()
 
+        if "displayName" in data or "username" in data:
+            invalidate_author(requested_user)
+
         return api.succeed()
     elif request.method == "DELETE":
         if request.user != requested_user:
@@ -115,13 +118,15 @@ def program_list(request, user_id, sort):
     requested_user = get_user(user_id, and_profile=False)
 
     # If the value isn't found or can't be turned into a number, these will return None
+    cursor = request.GET.get("cursor")
     offset = get_as_int(request.GET, "offset")
     limit = get_as_int(request.GET, "limit")
 
     try:
-        programs = get_programs(
+        programs, next_cursor = get_program_page(
             sort,
             Q(user=requested_user),
+            cursor=cursor,
             offset=offset,
             limit=limit,
             published_only=False,
@@ -129,6 +134,6 @@ def program_list(request, user_id, sort):
     except ValueError as err:
         return api.error(str(err))
 
-    program_dicts = [p.to_dict(include_code=False) for p in programs]
+    program_dicts = serialize_programs(programs, include_code=False)
 
-    return api.succeed({"sort": sort, "programs": program_dicts})
+    return api.succeed({"sort": sort, "programs": program_dicts, "nextCursor": next_cursor})
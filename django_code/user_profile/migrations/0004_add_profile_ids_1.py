@@ -2,9 +2,11 @@
 from __future__ import unicode_literals
 
 from django.db import migrations, models
-from user_profile.models import Profile, generate_id
+from user_profile.models import generate_id
 
 def fill_user_ids (apps, schema_editor):
+    # The historical model: fields added to Profile later don't exist yet
+    Profile = apps.get_model("user_profile", "Profile")
     for profile in Profile.objects.all():
         if profile.profile_id == "":
             profile.profile_id = generate_id()
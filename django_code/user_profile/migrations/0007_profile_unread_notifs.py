@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread(apps, schema_editor):
+    Profile = apps.get_model("user_profile", "Profile")
+    Notif = apps.get_model("notification", "Notif")
+
+    unread = (Notif.objects
+        .filter(target_user_id=OuterRef("user_id"), is_read=False)
+        .values("target_user_id")
+        .annotate(count=Count("*"))
+        .values("count"))
+    Profile.objects.update(unread_notifs=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0002_auto_20190113_0702'),
+        ('user_profile', '0006_profile_subscriptions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='unread_notifs',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
@@ -8,7 +8,7 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from program.models import Program
-from ourjseditor.util import get_id
+from ourjseditor.util import create_with_random_id, get_id
 
 def generate_id():
     return get_id()
@@ -36,12 +36,22 @@ class Profile(models.Model):
     # id. 6 digits, doesn't overlap with program ids
     profile_id = models.CharField(primary_key=True, max_length=6, default=generate_id)
     subscriptions = models.ManyToManyField("self", symmetrical=False)
+    # The number of unread notifications, kept up to date by notification.models (repair with `manage.py repair_notif_counts`)
+    unread_notifs = models.IntegerField(default=0)
+
+    # unread_notifs is only changed by UPDATEs of the count in the database, which saving a copy of the profile
+    # (e.g. save_user_profile, on every login) would undo
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("force_insert") and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "unread_notifs"]
+        super(Profile, self).save(*args, **kwargs)
 
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        Profile.objects.create(user=instance)
+        create_with_random_id(Profile, user=instance)
 
 
 @receiver(post_save, sender=User)
@@ -6,7 +6,7 @@ from django.contrib.auth.models import User
 from django.http import HttpResponse
 from django.db.models import Q
 
-from program.models import get_programs, PROGRAMS_PER_PAGE
+from program.models import get_program_page, invalidate_author, serialize_programs, PROGRAMS_PER_PAGE
 from user_profile.models import check_username
 
 
@@ -21,15 +21,15 @@ def index(request, username):
             'sort': 'new' if user == request.user else 'top' # If you're looking at your own profile, show new programs
         }
 
-        programs = get_programs(
+        programs, next_cursor = get_program_page(
             list_options['sort'],
             Q(user=user),
             published_only=False,
-            initial_load=True,
             request_user=request.user)
-        program_dicts = [p.to_dict(include_code=False) for p in programs]
+        program_dicts = serialize_programs(programs, include_code=False)
 
         list_options["initialPrograms"] = program_dicts
+        list_options["nextCursor"] = next_cursor
         user_data = {
             'user': user,
             'currentUser': request.user,
@@ -58,10 +58,13 @@ def edit(request, username):
             return HttpResponse('null', content_type="application/json", status=400)
         if display_name == '':
             display_name = username
+        names_changed = (username, display_name) != (request.user.username, request.user.profile.display_name)
         request.user.username = username
         request.user.profile.display_name = display_name
         request.user.profile.bio = bio
         request.user.save()
+        if names_changed:
+            invalidate_author(request.user)
         return redirect("/user/" + username)
     else:
         try:
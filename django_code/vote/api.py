@@ -2,6 +2,8 @@ from __future__ import unicode_literals
 
 import json
 
+from django.db import IntegrityError, transaction
+
 from ourjseditor import api
 from program.models import Program
 from .models import Vote, vote_types
@@ -15,36 +17,31 @@ def program_vote(request, program_id):
 
     if vote_type not in vote_types:
         return api.error("Invalid vote type.")
-    try:
-        voted_program = Program.objects.get(program_id=program_id)
-        if not voted_program.can_user_view(request.user):
-            return api.error("Not authorized.", status=401)
-
-        orig_votes = getattr(voted_program, vote_type + "_votes")
 
-        # Look for a vote of the same type cast by the user before
-        orig_vote = Vote.objects.get(voted_object_id=program_id, vote_type=vote_type, user_id=request.user.id)
+    voted_program = Program.objects.without_code().get(program_id=program_id)
+    if not voted_program.can_user_view(request.user):
+        return api.error("Not authorized.", status=401)
 
-        # If the vote already exists and:
-        if request.method == "DELETE":
-            setattr(voted_program, vote_type + "_votes", orig_votes - 1)
-            voted_program.save()
-
-            orig_vote.delete()
-            return api.succeed()
-        # If the specific vote already exists, and you're posting it again
-        elif request.method == "POST":
-            # 403 Forbidden, is used here beacuse there is no authentication that would allow the request
-            return api.error("Already voted.", status=403)
-    except Vote.DoesNotExist:
-        # If the vote doesn't already exist
+    # The vote and the program's vote count change together, or not at all
+    with transaction.atomic():
         if request.method == "POST":
-            Vote.objects.create(user_id=request.user.id, vote_type=vote_type, voted_object_id=program_id)
+            # The unique constraint on Vote rejects a second vote of the same type by the same user
+            try:
+                with transaction.atomic():
+                    Vote.objects.create(user_id=request.user.id, vote_type=vote_type, voted_object_id=program_id)
+            except IntegrityError:
+                # 403 Forbidden, is used here beacuse there is no authentication that would allow the request
+                return api.error("Already voted.", status=403)
 
-            setattr(voted_program, vote_type + "_votes", orig_votes + 1)
-            voted_program.save()
+            voted_program.add_votes(vote_type, 1)
 
             # Return with 201, created
             return api.succeed({}, status=201)
         elif request.method == "DELETE":
-            return api.error("Vote not found.", 404)
+            deleted, _ = Vote.objects.filter(voted_object_id=program_id, vote_type=vote_type, user_id=request.user.id).delete()
+            if not deleted:
+                return api.error("Vote not found.", status=404)
+
+            voted_program.add_votes(vote_type, -1)
+
+            return api.succeed()
@@ -0,0 +1,75 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:37
+
+import math
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+VOTE_TYPES = ["entertaining", "artistic", "informative"]
+
+
+# Copy of program.models.calculate_hot_score when this migration was written
+def calculate_hot_score(total_votes, published):
+    order = math.log10(max(total_votes, 1))
+    seconds = (published - datetime.datetime(2017, 1, 1)).total_seconds()
+    return round(order + seconds / (2 * 24 * 60 * 60), 7)
+
+
+# Duplicate votes could be cast before the constraint existed. Keep the first of each,
+# and recount the votes and hot score of the programs they were on
+def remove_duplicate_votes(apps, schema_editor):
+    Vote = apps.get_model("vote", "Vote")
+    Program = apps.get_model("program", "Program")
+
+    duplicates = list(Vote.objects
+        .values("user_id", "vote_type", "voted_object_id")
+        .annotate(first_id=Min("id"), count=Count("id"))
+        .filter(count__gt=1))
+
+    for duplicate in duplicates:
+        Vote.objects.filter(
+            user_id=duplicate["user_id"],
+            vote_type=duplicate["vote_type"],
+            voted_object_id=duplicate["voted_object_id"],
+        ).exclude(id=duplicate["first_id"]).delete()
+
+    programs = list(Program.objects
+        .filter(program_id__in={duplicate["voted_object_id"] for duplicate in duplicates})
+        .only("program_id", "last_published"))
+    counts = (Vote.objects
+        .filter(voted_object_id__in=[program.program_id for program in programs])
+        .values_list("voted_object_id", "vote_type")
+        .annotate(count=Count("id")))
+    counts = {(program_id, vote_type): count for program_id, vote_type, count in counts}
+
+    for program in programs:
+        for vote_type in VOTE_TYPES:
+            setattr(program, vote_type + "_votes", counts.get((program.program_id, vote_type), 0))
+        program.total_votes = sum(counts.get((program.program_id, vote_type), 0) for vote_type in VOTE_TYPES)
+        if program.last_published is None: # Unpublished programs aren't ranked
+            program.hot_score = 0
+        else:
+            program.hot_score = calculate_hot_score(program.total_votes, program.last_published)
+
+    fields = [vote_type + "_votes" for vote_type in VOTE_TYPES] + ["total_votes", "hot_score"]
+    Program.objects.bulk_update(programs, fields, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vote', '0002_alter_vote_id'),
+        ('program', '0011_program_hot_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            code=remove_duplicate_votes,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user_id', 'vote_type', 'voted_object_id'), name='vote_unique_per_user'),
+        ),
+    ]
@@ -10,3 +10,9 @@ class Vote(models.Model):
     cast_time = models.DateTimeField(auto_now_add=True, blank=False)
     vote_type = models.CharField(max_length=12) # one of "entertaining" "artistic" or "informative" for programs
     user_id = models.IntegerField() # Basically a ForeignKey, but we don't need to access any properties of it
+
+    class Meta:
+        # One vote of each type per user per object. Also the index for looking up a user's vote
+        constraints = [
+            models.UniqueConstraint(fields=["user_id", "vote_type", "voted_object_id"], name="vote_unique_per_user"),
+        ]
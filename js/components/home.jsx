@@ -92,7 +92,7 @@ export default class Home extends Preact.Component {
                             {
                                 this.programs.popular.map(program => <Program program={program} />)
                             }
-                            <span id="showMore"><a href="/programs/top">Browse Programs &#10095;</a></span>
+                            <span id="showMore"><a href="/programs/hot">Browse Programs &#10095;</a></span>
                         </tr>
                     </table>
                 </PageSection>
@@ -7,6 +7,7 @@ import Api from "../util/wrapper"
 
 const sorts = [
     "new",
+    "hot",
     "top",
     "artistic",
     "entertaining",
@@ -42,9 +43,9 @@ export default class ProgramList extends Preact.Component {
             console.info("Assuming no programs.");
         }
 
-        if (this.state.programList.length <= this.perPage) {
-            this.state.programList.complete = true;
-        }
+        //The server sends a null cursor when there are no more programs to load
+        this.state.programList.nextCursor = props.listOptions.nextCursor;
+        this.state.programList.complete = !props.listOptions.nextCursor;
         //hasShowMoreButton should always be the opposite of whether the current programList this.state.programList is complete
         this.state.hasShowMoreButton = !this.state.programList.complete;
     }
@@ -59,20 +60,10 @@ export default class ProgramList extends Preact.Component {
 
         const programList = cachedProgramLists[sort];
 
-        let toFetch = this.perPage;
-        // If we're loading more programs because of a sort change, request an extra program
-        if (newSort) {
-            console.log("loading more programs");
-            toFetch += 1;
-        }
-
-        this.api.getPrograms(this.baseUrl + sort, programList.length, toFetch).then(newPrograms => {
-            programList.push(...newPrograms);
-
-            if (newPrograms.length < toFetch) {
-                this.setState({ "hasShowMoreButton": false });
-                programList.complete = true;
-            }
+        this.api.getProgramPage(this.baseUrl + sort, programList.nextCursor, this.perPage).then(res => {
+            programList.push(...res.programs);
+            programList.nextCursor = res.nextCursor;
+            programList.complete = !res.nextCursor;
 
             this.setState({
                 "programList": programList,
@@ -134,11 +125,8 @@ export default class ProgramList extends Preact.Component {
 
         const programRows = [];
 
-        //Ignore the last program (which we use to keep track of if we have more programs), if we haven't completed the current list
-        let numPrograms = this.state.programList.length - (this.state.programList.complete ? 0 : 1);
-
         //Collect array into sub arrays of four (or numCols)
-        for (let i = 0; i < numPrograms; i ++) {
+        for (let i = 0; i < this.state.programList.length; i ++) {
             if (i % this.state.numCols === 0) {
                 programRows.push([]);
             }
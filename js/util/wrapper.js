@@ -39,8 +39,10 @@ export default class Api {
             { displayName, username, password }, this.csrf);
     }
 
-    getPrograms(src, offset = 0, limit = 20) {
+    //Resolves to { programs, nextCursor }. Leave cursor out to get the first page
+    getProgramPage(src, cursor, limit = 20) {
         //TODO: way of auto-encoding queryParams?
-        return fetch(`${src}?offset=${offset}&limit=${limit}`).then(json).then(res => res.programs);
+        const cursorParam = cursor ? `&cursor=${encodeURIComponent(cursor)}` : "";
+        return fetch(`${src}?limit=${limit}${cursorParam}`).then(json);
     }
 }